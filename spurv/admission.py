@@ -0,0 +1,113 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Shedding load instead of queueing it.
+
+A handler that can not keep up lets messages queue up in its socket,
+and every message waits longer than the one before it. A handler given
+an Admission turns messages away once it is overloaded:
+
+    @ctx.rep.listen("tcp://*:5555",
+                    admission=Admission(rate=5000, max_queue=100,
+                                        reject=["busy"]))
+    def lookup(message):
+        ...
+
+Rep handlers send the reject reply right away, without decoding the
+request or calling the handler. It is sent like the replies of the
+handler, through its codec if it has one. Other handlers drop the
+message, or with sample=N still handle every Nth of the messages they
+shed.
+
+A handler is overloaded when it is over its rate, a token bucket that
+refills rate tokens per second up to burst, or when it is behind. zmq
+does not tell how many messages are queued in a socket, so being behind
+is approximated: it is the number of messages in a row that were already
+waiting when the handler came back for one. When that passes max_queue,
+the handler has had a backlog for max_queue messages, and sheds until it
+finds the socket empty. This is checked before receiving, since a REP
+socket does not tell whether more requests are waiting until it has
+replied to the one it has.
+
+Counters are not protected by locks, like spurv.metrics. Each process
+of a handler with process workers has its own rate.
+"""
+import zmq
+
+from .metrics import clock
+
+class TokenBucket(object):
+    """Allows rate events per second, and bursts of up to burst."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self._updated = clock()
+
+    def take(self):
+        """Take a token if there is one. Returns whether there was."""
+        now = clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class Admission(object):
+    """Decides which messages a handler takes on."""
+
+    def __init__(self, rate=None, burst=None, max_queue=None,
+                 reject=b"overloaded", sample=None):
+        """Arguments:
+        - `rate`, `burst`: The token bucket, no rate limit if rate is None.
+        - `max_queue`: How far behind the handler may get, see above.
+        - `reject`: The reply Rep handlers send when overloaded.
+        - `sample`: If set, every sample-th message that arrives while
+          overloaded is handled anyway.
+        """
+        self.bucket = None if rate is None else TokenBucket(rate, burst)
+        self.max_queue = max_queue
+        self.reject = reject
+        self.sample = sample
+        self.admitted = 0
+        self.shed = 0
+        self._streak = 0
+        self._overloaded = 0
+
+    def before_receive(self, socket):
+        """Note whether a message is already waiting on socket. Called
+        before every receive, including ones that find nothing."""
+        if self.max_queue is None:
+            return
+        events = socket.zmqsock.getsockopt(zmq.EVENTS)
+        if socket.pending or events & zmq.POLLIN:
+            self._streak += 1
+        else:
+            self._streak = 0
+
+    def admit(self):
+        """Whether to handle the message just received."""
+        behind = self.max_queue is not None and self._streak > self.max_queue
+        if not behind and (self.bucket is None or self.bucket.take()):
+            self.admitted += 1
+            return True
+        self._overloaded += 1
+        if self.sample and self._overloaded % self.sample == 0:
+            self.admitted += 1
+            return True
+        self.shed += 1
+        return False
+
+    def stats(self):
+        return {"admitted": self.admitted, "shed": self.shed}
+
+    def __repr__(self):
+        return "<Admission({0} admitted, {1} shed)>".format(self.admitted,
+                                                            self.shed)
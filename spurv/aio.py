@@ -0,0 +1,230 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+asyncio flavour of spurv, built on zmq.asyncio.
+
+Sockets created by these hubs have coroutine send/recv methods, and
+handlers registered with @ctx.rep.listen, @ctx.sub.listen or
+@ctx.pull.listen may be
+``async def`` functions. Spurv.start schedules every handler as a task
+on the running event loop rather than spending a thread or greenlet
+on each of them:
+
+    ctx = aio.Spurv()
+
+    @ctx.rep.listen("tcp://*:5555")
+    async def echo(message):
+        return message
+
+    asyncio.run(ctx.serve())
+
+Messages go through the same steps as on other sockets, so metrics,
+tracing, compression, shared memory and packed messages work the same,
+and aio sockets can talk to sockets of a plain Spurv. Buffered sockets
+made by the Pub and Push hubs have coroutine send, flush and close
+methods.
+
+Handlers take a message at a time, with the codec, copy and metrics
+options of other handlers, and record a span when the message is traced.
+The options that are served by blocking on sockets or by other threads,
+batch, conflate, cache, admission, credit and concurrency, are refused
+with a ValueError when the handler is registered. Spans are carried on
+per thread, so a handler that awaits while other handlers send may have
+its trace carried on by their messages.
+
+This module requires python 3.7 or newer.
+"""
+import asyncio
+import inspect
+import sys
+import zmq.asyncio
+
+from . import buffer, context, enc, handler, hub, metrics
+from .hub import Req, Router, Dealer, XPub, XSub, Pair
+
+class Socket(hub.Socket):
+    """Like hub.Socket, but send and recv are coroutines."""
+
+    async def send(self, content, flags=0, copy=True, track=False):
+        frames, copy = self._encode(content, copy)
+        return await self.send_frames(frames, flags, copy, track)
+
+    async def send_frames(self, frames, flags=0, copy=True, track=False):
+        frames = self._outgoing(frames)
+        started = metrics.clock()
+        if enc.is_bytes(frames):
+            tracker = await self.zmqsock.send(frames, flags, copy, track)
+        else:
+            tracker = await self.zmqsock.send_multipart(frames, flags, copy,
+                                                        track)
+        if self.metrics is not None:
+            self.metrics.sent(frames, metrics.clock() - started)
+        return tracker
+
+    async def recv(self, decode=False, flags=0, copy=True, track=False):
+        if self.codec is not None:
+            copy = self.codec.copy
+        items = await self.recv_frames(flags, copy, track)
+        return self._unpack(items, decode, copy)
+
+    async def recv_frames(self, flags=0, copy=True, track=False):
+        if self._unpacked:
+            return self._unpacked.popleft()
+        started = metrics.clock()
+        items = await self.zmqsock.recv_multipart(flags, copy, track)
+        if self.metrics is not None:
+            self.metrics.received(items, metrics.clock() - started)
+        return self._incoming(items, copy)
+
+class BufferedSocket(buffer.BufferedSocket):
+    """Like buffer.BufferedSocket, but send, flush and close are
+    coroutines, and buffered messages are flushed by the event loop once
+    max_delay has passed."""
+
+    _timer = None
+
+    async def send(self, content):
+        if self._add(content):
+            await self.flush()
+        elif self._timer is None:
+            loop = asyncio.get_event_loop()
+            self._timer = loop.call_later(self.max_delay / 1000.0,
+                                          self._flush_later)
+
+    def _flush_later(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for frames in self._take():
+            await self.socket.send_frames(frames)
+
+    async def close(self, linger=None):
+        await self.flush()
+        self.socket.close(linger)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type_, value, traceback):
+        await self.close()
+
+async def _call(fn, message):
+    result = fn(message)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+async def reply_forever(socket, handler, decode=True):
+    with socket:
+        while True:
+            message = await socket.recv(decode=decode)
+            reply = await _call(handler, message)
+            await socket.send(reply)
+
+async def listen_forever(socket, handler, decode=True):
+    with socket:
+        while True:
+            message = await socket.recv(decode=decode)
+            await _call(handler, message)
+
+UNSUPPORTED = ("batch", "conflate", "cache", "admission", "credit")
+
+class Handler(handler.Handler):
+    """A handler whose start returns a coroutine.
+
+    The registered function may be either a plain function or a
+    coroutine function."""
+
+    def __init__(self, *args, **kwargs):
+        super(Handler, self).__init__(*args, **kwargs)
+        refused = [name for name in UNSUPPORTED
+                   if getattr(self, name) not in (None, False)]
+        if self.concurrency > 1:
+            refused.append("concurrency")
+        if refused:
+            raise ValueError("aio handlers do not support {0}".format(
+                ", ".join(refused)))
+
+    async def serve(self, socket, flags=0):
+        message = await socket.recv(decode=self.decode, flags=flags,
+                                    copy=self.copy)
+        result = await self.call(message)
+        if self.replies:
+            await socket.send(result)
+
+    async def call(self, message):
+        tracer = self.hub.tracer
+        span = None if tracer is None else tracer.current()
+        if self.metrics is None and span is None:
+            return await _call(self.fn, message)
+        started = self._begin(span)
+        try:
+            return await _call(self.fn, message)
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.failed()
+            raise
+        finally:
+            self._finish(span, started)
+
+    async def _start(self):
+        with self.socket() as socket:
+            while True:
+                await self.serve(socket)
+
+    def start(self):
+        return self._start()
+
+class Rep(hub.Rep):
+
+    handler_class = Handler
+
+class Pull(hub.Pull):
+
+    handler_class = Handler
+
+class Pub(hub.Pub):
+
+    buffered_class = BufferedSocket
+
+class Push(hub.Push):
+
+    buffered_class = BufferedSocket
+
+class Sub(hub.Sub):
+
+    handler_class = Handler
+
+    def runners(self):
+        """Every handler gets a socket of its own."""
+        return list(self.handlers)
+
+def _spawn(start):
+    return asyncio.ensure_future(start())
+
+class Spurv(context.Spurv):
+    """A Spurv using a zmq.asyncio context and the hubs in this module."""
+
+    hub_module = sys.modules[__name__]
+    context_class = zmq.asyncio.Context
+
+    def start(self, spawn=_spawn):
+        """Schedule every handler as a task on the current event loop
+        and return the tasks."""
+        return super(Spurv, self).start(spawn)
+
+    async def serve(self):
+        """Run every handler until one of them fails."""
+        await asyncio.gather(*self.start())
+
+    def run(self):
+        """Block, running serve() on a fresh event loop."""
+        return asyncio.run(self.serve())
@@ -0,0 +1,233 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Benchmarks comparing spurv sockets to the raw pyzmq sockets below them.
+
+Run it with:
+
+    python -m spurv.bench --help
+
+Every combination of pattern, transport, message size and frame count
+is run twice, once sending and receiving with the Socket methods of
+spurv ("spurv") and once with send_multipart/recv_multipart on the
+underlying zmqsock ("raw"). The difference between the two is the
+overhead spurv adds on top of pyzmq.
+
+For pubsub and pushpull, messages are streamed from one thread to
+another and the latency is the one-way latency of each message. For
+reqrep and dealerrouter, the latency is the round trip time of each
+request and the server runs in a thread of its own.
+"""
+import argparse
+import collections
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import zmq
+
+from .context import Spurv
+from .metrics import clock
+
+PATTERNS = ("pubsub", "pushpull", "reqrep", "dealerrouter")
+TRANSPORTS = ("inproc", "ipc", "tcp")
+LAYERS = ("raw", "spurv")
+
+# The sending and receiving hub of each pattern, the receiver binds.
+_HUBS = {
+    "pubsub": ("pub", "sub"),
+    "pushpull": ("push", "pull"),
+    "reqrep": ("req", "rep"),
+    "dealerrouter": ("dealer", "router"),
+}
+
+_timestamp = struct.Struct("d")
+
+Result = collections.namedtuple(
+    "Result", "pattern transport layer size frames count rate p50 p99")
+
+def _percentile(ordered, percent):
+    index = int(round((len(ordered) - 1) * percent / 100.0))
+    return ordered[index]
+
+class _Endpoints(object):
+
+    def __init__(self):
+        self._tempdir = None
+        self._count = 0
+
+    def address(self, transport):
+        self._count += 1
+        if transport == "inproc":
+            return "inproc://spurv-bench-{0}".format(self._count)
+        if transport == "ipc":
+            if self._tempdir is None:
+                self._tempdir = tempfile.mkdtemp(prefix="spurv-bench-")
+            return "ipc://{0}".format(
+                os.path.join(self._tempdir, str(self._count)))
+        return "tcp://127.0.0.1"
+
+    def cleanup(self):
+        if self._tempdir is not None:
+            shutil.rmtree(self._tempdir, ignore_errors=True)
+
+def _methods(socket, layer):
+    if layer == "raw":
+        return socket.zmqsock.send_multipart, socket.zmqsock.recv_multipart
+    return socket.send, socket.recv
+
+def _connect_pair(spurv, pattern, address):
+    sender_hub, receiver_hub = _HUBS[pattern]
+    receiver = getattr(spurv, receiver_hub).socket()
+    if address.startswith("tcp://"):
+        port = receiver.bind_to_random_port(address)
+        address = "{0}:{1}".format(address, port)
+    else:
+        receiver.bind(address)
+    if pattern == "pubsub":
+        receiver.zmqsock.setsockopt(zmq.RCVHWM, 0)
+        receiver.zmqsock.setsockopt(zmq.SUBSCRIBE, b"")
+    sender = getattr(spurv, sender_hub).socket()
+    sender.zmqsock.setsockopt(zmq.SNDHWM, 0)
+    sender.connect(address)
+    return sender, receiver
+
+def _stream(sender, receiver, layer, payload, count):
+    send, _ = _methods(sender, layer)
+    _, recv = _methods(receiver, layer)
+    latencies = []
+
+    def receive():
+        for _ in range(count):
+            message = recv()
+            latencies.append(clock() - _timestamp.unpack(message[0])[0])
+
+    # Make sure the connection is up before measuring, subscribers miss
+    # everything published before they are connected.
+    while not receiver.zmqsock.poll(10):
+        send([_timestamp.pack(clock())] + payload)
+    recv()
+    while receiver.zmqsock.poll(0):
+        recv()
+    thread = threading.Thread(target=receive)
+    thread.start()
+    started = clock()
+    for _ in range(count):
+        send([_timestamp.pack(clock())] + payload)
+    thread.join()
+    return clock() - started, latencies
+
+def _round_trip(sender, receiver, layer, payload, count):
+    send, recv = _methods(sender, layer)
+    reply, serve = _methods(receiver, layer)
+
+    def echo():
+        for _ in range(count):
+            reply(serve())
+
+    thread = threading.Thread(target=echo)
+    thread.start()
+    latencies = []
+    started = clock()
+    for _ in range(count):
+        sent = clock()
+        send(payload)
+        recv()
+        latencies.append(clock() - sent)
+    elapsed = clock() - started
+    thread.join()
+    return elapsed, latencies
+
+def run(pattern, transport, layer, size, frames, count, endpoints=None):
+    """Run one benchmark and return a Result. Latencies are in seconds."""
+    own_endpoints = endpoints is None
+    if own_endpoints:
+        endpoints = _Endpoints()
+    payload = [b"x" * size] * frames
+    spurv = Spurv()
+    try:
+        sender, receiver = _connect_pair(spurv, pattern,
+                                         endpoints.address(transport))
+        with sender, receiver:
+            if pattern in ("pubsub", "pushpull"):
+                elapsed, latencies = _stream(sender, receiver, layer,
+                                             payload, count)
+            else:
+                elapsed, latencies = _round_trip(sender, receiver, layer,
+                                                 payload, count)
+    finally:
+        spurv.destroy()
+        if own_endpoints:
+            endpoints.cleanup()
+    latencies.sort()
+    return Result(pattern, transport, layer, size, frames, count,
+                  count / elapsed, _percentile(latencies, 50),
+                  _percentile(latencies, 99))
+
+def run_all(patterns=PATTERNS, transports=TRANSPORTS, layers=LAYERS,
+            sizes=(16, 1024, 65536), frame_counts=(1, 4), count=10000):
+    """Run every combination, yielding Results as they are done."""
+    endpoints = _Endpoints()
+    try:
+        for pattern in patterns:
+            for transport in transports:
+                for size in sizes:
+                    for frames in frame_counts:
+                        for layer in layers:
+                            yield run(pattern, transport, layer, size,
+                                      frames, count, endpoints)
+    finally:
+        endpoints.cleanup()
+
+_ROW = "{0:<13} {1:<7} {2:<6} {3:>7} {4:>6} {5:>12} {6:>10} {7:>10}"
+
+def report(results, out=sys.stdout):
+    out.write(_ROW.format("pattern", "trans", "layer", "size", "frames",
+                          "msgs/s", "p50 us", "p99 us") + "\n")
+    for result in results:
+        out.write(_ROW.format(
+            result.pattern, result.transport, result.layer, result.size,
+            result.frames, "{0:.0f}".format(result.rate),
+            "{0:.1f}".format(result.p50 * 1e6),
+            "{0:.1f}".format(result.p99 * 1e6)) + "\n")
+        out.flush()
+
+def _list(kind, choices=None):
+    def parse(value):
+        items = [kind(item) for item in value.split(",")]
+        if choices is not None:
+            for item in items:
+                if item not in choices:
+                    raise argparse.ArgumentTypeError(
+                        "{0} is not one of {1}".format(item, ", ".join(choices)))
+        return items
+    return parse
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m spurv.bench",
+        description="Measure the overhead of spurv over raw pyzmq.")
+    parser.add_argument("--patterns", type=_list(str, PATTERNS),
+                        default=list(PATTERNS))
+    parser.add_argument("--transports", type=_list(str, TRANSPORTS),
+                        default=list(TRANSPORTS))
+    parser.add_argument("--layers", type=_list(str, LAYERS),
+                        default=list(LAYERS))
+    parser.add_argument("--sizes", type=_list(int), default=[16, 1024, 65536],
+                        help="Comma separated frame sizes in bytes.")
+    parser.add_argument("--frames", type=_list(int), default=[1, 4],
+                        help="Comma separated payload frame counts.")
+    parser.add_argument("--count", type=int, default=10000,
+                        help="Messages per benchmark.")
+    args = parser.parse_args(argv)
+    report(run_all(args.patterns, args.transports, args.layers, args.sizes,
+                   args.frames, args.count))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Buffering outgoing messages to send them in bulk.
+
+A BufferedSocket collects the messages passed to send and only hands
+them to zmq once enough of them have piled up, or the oldest of them
+has waited long enough. With pack=True, consecutive messages with the
+same first frame (the topic, for PUB sockets) are packed into a single
+message of three frames:
+
+    [topic, PACKED, <the remaining frames of each message>]
+
+Receiving sockets recognize these and hand out the original messages
+one at a time, so subscriptions and handlers work the same whether the
+sender packs or not.
+"""
+import struct
+
+from . import enc
+from .metrics import clock
+
+PACKED = b"\x00spurv-packed\x00"
+
+_length = struct.Struct("!I")
+
+def pack(messages):
+    """Pack a list of messages, each a list of frames, into one bytes."""
+    parts = []
+    for frames in messages:
+        parts.append(_length.pack(len(frames)))
+        for frame in frames:
+            parts.append(_length.pack(len(frame)))
+            parts.append(frame)
+    return b"".join(parts)
+
+def unpack(data):
+    """The inverse of pack. Returns bytes when data is bytes, and slices
+    of data when it is a memoryview."""
+    messages = []
+    offset, end = 0, len(data)
+    while offset < end:
+        count, = _length.unpack_from(data, offset)
+        offset += _length.size
+        frames = []
+        for _ in range(count):
+            size, = _length.unpack_from(data, offset)
+            offset += _length.size
+            frames.append(data[offset:offset + size])
+            offset += size
+        messages.append(frames)
+    return messages
+
+def is_packed(frames):
+    """Whether a received message is a packed one."""
+    if len(frames) != 3 or len(frames[1]) != len(PACKED):
+        return False
+    marker = frames[1]
+    return getattr(marker, "bytes", marker) == PACKED
+
+def _size(frames):
+    return sum(len(frame) for frame in frames)
+
+class BufferedSocket(object):
+    """Wraps a socket, buffering what is sent on it.
+
+    Buffered messages are flushed when there are max_count of them, when
+    they add up to max_bytes, or when send is called more than max_delay
+    milliseconds after the oldest of them was buffered. To have them
+    flushed once max_delay has passed even if nothing more is sent, add
+    the socket to the Reactor serving the handlers that send on it with
+    Reactor.add_buffer, or call flush_due() or flush() now and then.
+    Closing the socket flushes it.
+    """
+
+    def __init__(self, socket, max_count=1000, max_bytes=65536, max_delay=10,
+                 pack=False):
+        self.socket = socket
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.pack = pack
+        self._pending = []
+        self._bytes = 0
+        self._deadline = None
+
+    @property
+    def zmqsock(self):
+        return self.socket.zmqsock
+
+    @property
+    def pending(self):
+        """The number of messages waiting to be flushed."""
+        return len(self._pending)
+
+    @property
+    def deadline(self):
+        """The metrics.clock() time at which the oldest buffered message
+        has waited max_delay, or None if nothing is buffered."""
+        return self._deadline if self._pending else None
+
+    def flush_due(self, now=None):
+        """Flush if the oldest buffered message has waited max_delay."""
+        now = clock() if now is None else now
+        if self._pending and now >= self._deadline:
+            self.flush()
+
+    def send(self, content):
+        """Buffer content, encoded like Socket.send would."""
+        if self._add(content):
+            self.flush()
+
+    def _add(self, content):
+        # Whether the buffer should be flushed now.
+        frames, _ = self.socket._encode(content, True)
+        if enc.is_bytes(frames):
+            frames = [frames]
+        now = clock()
+        if not self._pending:
+            self._deadline = now + self.max_delay / 1000.0
+        self._pending.append(frames)
+        self._bytes += _size(frames)
+        return (len(self._pending) >= self.max_count or
+                self._bytes >= self.max_bytes or now >= self._deadline)
+
+    def flush(self):
+        """Send everything that is buffered."""
+        for frames in self._take():
+            self.socket.send_frames(frames)
+
+    def _take(self):
+        # Empty the buffer, returning the messages to send, packed if
+        # pack is set.
+        pending, self._pending, self._bytes = self._pending, [], 0
+        if not self.pack:
+            return pending
+        messages = []
+        start = 0
+        while start < len(pending):
+            topic = pending[start][0]
+            end = start + 1
+            while end < len(pending) and pending[end][0] == topic:
+                end += 1
+            if end - start == 1:
+                messages.append(pending[start])
+            else:
+                rest = [frames[1:] for frames in pending[start:end]]
+                messages.append([topic, PACKED, pack(rest)])
+            start = end
+        return messages
+
+    def close(self, linger=None):
+        self.flush()
+        self.socket.close(linger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<BufferedSocket({0}, {1} pending)>".format(
+            self.socket, self.pending)
@@ -0,0 +1,156 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Caching the replies of idempotent reply handlers.
+
+A Rep handler given a cache looks up every request by a hash of its raw
+frames before decoding it. On a hit, the encoded reply is sent straight
+back, without decoding, calling the handler or encoding:
+
+    @ctx.rep.listen("tcp://*:5555", cache=LRU(10000, ttl=60))
+    def lookup(message):
+        ...
+
+Entries are evicted least recently used first when there are more than
+size of them, or when their requests and replies take up more than
+max_bytes. Entries older than ttl seconds are not used.
+
+With invalidate, the handler subscribes to an address and drops cached
+replies when told to. A message with only a topic frame clears the
+whole cache, otherwise the frames after the topic are a request whose
+reply is dropped:
+
+    @ctx.rep.listen("tcp://*:5555", cache=LRU(10000),
+                    invalidate="tcp://writer:5560", invalidate_topic="lookup")
+"""
+import collections
+import hashlib
+import struct
+import threading
+import zmq
+
+from .metrics import clock
+
+_hash = getattr(hashlib, "blake2b", hashlib.sha1)
+_length = struct.Struct("!I")
+
+def request_key(frames):
+    """A hash of the raw frames of a request."""
+    digest = _hash()
+    for frame in frames:
+        digest.update(_length.pack(len(frame)))
+        digest.update(frame)
+    return digest.digest()
+
+def _size(frames):
+    if isinstance(frames, bytes):
+        return len(frames)
+    return sum(len(frame) for frame in frames)
+
+class LRU(object):
+    """A thread-safe least recently used cache of encoded replies."""
+
+    def __init__(self, size=1000, ttl=None, max_bytes=None):
+        """Arguments:
+        - `size`: The largest number of replies to keep.
+        - `ttl`: How many seconds a reply can be used for, forever if None.
+        - `max_bytes`: The largest number of bytes of requests and replies
+          to keep, unlimited if None.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._followed = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The reply cached for key, or None."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            reply, size, expires = entry
+            if expires is not None and expires <= clock():
+                self.bytes -= size
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return reply
+
+    def put(self, key, reply):
+        """Cache reply, which must be bytes or a list of bytes, for key."""
+        size = len(key) + _size(reply)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = None if self.ttl is None else clock() + self.ttl
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (reply, size, expires)
+            self.bytes += size
+            while (len(self._entries) > self.size or
+                   (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def follow(self, context, address, topic=b""):
+        """Subscribe to topic on address in a background thread, dropping
+        replies as told to, see the module documentation. Following the
+        same address and topic twice does nothing."""
+        if (address, topic) in self._followed:
+            return
+        self._followed.add((address, topic))
+        socket = context.socket(zmq.SUB)
+        socket.setsockopt(zmq.SUBSCRIBE, topic)
+        socket.connect(address)
+        thread = threading.Thread(target=self._follow, args=(socket,))
+        thread.daemon = True
+        thread.start()
+
+    def _follow(self, socket):
+        try:
+            with socket:
+                while True:
+                    frames = socket.recv_multipart()
+                    if len(frames) == 1:
+                        self.clear()
+                    else:
+                        self.invalidate(request_key(frames[1:]))
+        except zmq.ContextTerminated:
+            pass
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.bytes,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+    def __repr__(self):
+        return "<LRU({0}/{1} entries, {2} bytes)>".format(
+            len(self._entries), self.size, self.bytes)
@@ -0,0 +1,208 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Codecs turn python objects into the frames of a message and back.
+
+By default, sockets send strings and lists of strings and receive lists
+of strings or bytes. A codec set on a Spurv, on a hub or on a single
+handler replaces that: Socket.send passes its argument to codec.encode
+and sends the resulting frames, and Socket.recv returns whatever
+codec.decode makes of the received frames.
+
+    ctx = Spurv(codec=codec.Pickle())
+
+A codec is any object with encode(obj) returning a list of bytes-like
+frames, decode(frames) returning an object, and a boolean attribute
+copy. When copy is false, the frames are sent without copying and
+decode gets zmq.Frame objects instead of bytes.
+
+A Schema describes a message frame by frame, and hands out namedtuples
+with every field already converted to its type:
+
+    trade = Schema("topic:str seq:uint64 price:float64 payload:bytes")
+
+    @ctx.sub.listen("tcp://feed:5556", subs="", codec=trade)
+    def on_trade(message):
+        message.seq + 1  # an int
+
+    socket.codec = trade
+    socket.send(("trade", 17, 101.5, b"..."))
+"""
+import collections
+import pickle
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from .enc import is_string
+
+class Codec(object):
+    """Base class for codecs."""
+
+    copy = True
+
+    def encode(self, obj):
+        """Implemented by subclasses."""
+
+    def decode(self, frames):
+        """Implemented by subclasses."""
+
+    def __repr__(self):
+        return "<{0}>".format(self.__class__.__name__)
+
+class Msgpack(Codec):
+    """Sends any msgpack-serializable object as a single frame.
+
+    Requires the msgpack package."""
+
+    def __init__(self, **unpack_options):
+        if msgpack is None:
+            raise ImportError("The Msgpack codec requires msgpack")
+        unpack_options.setdefault("raw", False)
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self._unpack_options = unpack_options
+
+    def encode(self, obj):
+        return [self._packer.pack(obj)]
+
+    def decode(self, frames):
+        return msgpack.unpackb(frames[0], **self._unpack_options)
+
+class Struct(Codec):
+    """Sends tuples of fixed layout as a single frame packed with the
+    struct module, eg. Struct("!IQd") for (uint32, uint64, double)."""
+
+    def __init__(self, fmt):
+        self._struct = struct.Struct(fmt)
+
+    @property
+    def format(self):
+        return self._struct.format
+
+    def encode(self, obj):
+        return [self._struct.pack(*obj)]
+
+    def decode(self, frames):
+        return self._struct.unpack(frames[0])
+
+    def __repr__(self):
+        return "<Struct({0!r})>".format(self.format)
+
+class Pickle(Codec):
+    """Sends any picklable object.
+
+    With protocol 5 (python 3.8 and newer), large buffers that support
+    out-of-band pickling, like pickle.PickleBuffer and numpy arrays, are
+    not copied into the pickle but sent as separate frames after it,
+    without copying. On the receiving end, they are handed to pickle as
+    views on the received frames.
+
+    Only use this with peers you trust, unpickling runs arbitrary code.
+    """
+
+    copy = False
+
+    def __init__(self, protocol=None):
+        if protocol is None:
+            protocol = pickle.HIGHEST_PROTOCOL
+        self.protocol = protocol
+
+    @property
+    def out_of_band(self):
+        return self.protocol >= 5
+
+    def encode(self, obj):
+        if not self.out_of_band:
+            return [pickle.dumps(obj, self.protocol)]
+        buffers = []
+        frames = [pickle.dumps(obj, self.protocol,
+                               buffer_callback=buffers.append)]
+        frames.extend(buffer.raw() for buffer in buffers)
+        return frames
+
+    def decode(self, frames):
+        if not self.out_of_band:
+            return pickle.loads(frames[0].bytes)
+        return pickle.loads(frames[0].buffer,
+                            buffers=[frame.buffer for frame in frames[1:]])
+
+    def __repr__(self):
+        return "<Pickle(protocol={0})>".format(self.protocol)
+
+_FIELD_FORMATS = {
+    "int8": "b", "uint8": "B", "int16": "h", "uint16": "H",
+    "int32": "i", "uint32": "I", "int64": "q", "uint64": "Q",
+    "float32": "f", "float64": "d", "bool": "?",
+}
+
+FIELD_TYPES = ("str", "bytes") + tuple(sorted(_FIELD_FORMATS))
+
+def _parse_fields(fields):
+    if is_string(fields):
+        fields = [field.split(":") for field in fields.split()]
+    return [(name, type_) for name, type_ in fields]
+
+class Schema(Codec):
+    """Sends messages with one frame per field, each of a fixed type.
+
+    fields is either a list of (name, type) pairs or a string like
+    "topic:str seq:uint64". The types are str, bytes, bool, int8 to
+    int64, uint8 to uint64, float32 and float64. Numbers are sent in
+    network byte order. The encoder and decoder are generated once, so
+    a message costs no per-frame type inspection.
+
+    decode returns a namedtuple of the fields, encode takes any sequence
+    of them in order.
+    """
+
+    def __init__(self, fields, name="Message", encoding="utf-8"):
+        self.fields = _parse_fields(fields)
+        self.encoding = encoding
+        for field, type_ in self.fields:
+            if type_ not in FIELD_TYPES:
+                raise ValueError("Unknown type {0!r} of field {1!r}".format(
+                    type_, field))
+        self.record = collections.namedtuple(
+            name, [field for field, _ in self.fields])
+        self.encode, self.decode = self._compile()
+
+    def _compile(self):
+        namespace = {"Record": self.record, "encoding": self.encoding}
+        names, decoders, encoders = [], [], []
+        for index, (_, type_) in enumerate(self.fields):
+            name = "f{0}".format(index)
+            names.append(name)
+            if type_ == "str":
+                decoders.append("{0}.decode(encoding)".format(name))
+                encoders.append("{0}.encode(encoding)".format(name))
+            elif type_ == "bytes":
+                decoders.append(name)
+                encoders.append(name)
+            else:
+                packer = struct.Struct("!" + _FIELD_FORMATS[type_])
+                namespace["_pack{0}".format(index)] = packer.pack
+                namespace["_unpack{0}".format(index)] = packer.unpack
+                decoders.append("_unpack{0}({1})[0]".format(index, name))
+                encoders.append("_pack{0}({1})".format(index, name))
+        unpacked = ", ".join(names) + ","
+        source = (
+            "def encode(obj):\n"
+            "    {0} = obj\n"
+            "    return [{1}]\n"
+            "def decode(frames):\n"
+            "    {0} = frames\n"
+            "    return Record({2})\n"
+        ).format(unpacked, ", ".join(encoders), ", ".join(decoders))
+        exec(source, namespace)
+        return namespace["encode"], namespace["decode"]
+
+    def __repr__(self):
+        return "<Schema({0})>".format(" ".join(
+            "{0}:{1}".format(field, type_) for field, type_ in self.fields))
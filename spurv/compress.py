@@ -0,0 +1,161 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Compressing large frames sent between hosts.
+
+A socket with a Compression compresses the frames of a message that are
+larger than a threshold, as long as it is connected or bound to a
+transport that leaves the host, like tcp. On inproc and ipc, copying
+memory is cheaper than compressing it, so nothing is compressed there:
+
+    ctx = Spurv(compression=Compression(Zlib(level=1), threshold=1024))
+
+Which frames are compressed is told in a flag frame at the end of the
+message, see spurv.trailer, with the id of the compressor as its header.
+Envelope frames are never compressed.
+
+Every socket looks for the flag frame and decompresses, so receivers
+need no configuration. A frame that does not shrink by at least
+min_saving is sent as it is, and after a run of those, compression is
+not tried for a while, so incompressible data costs little CPU. Each
+socket keeps track of that on its own, on a clone of the Compression it
+was made with. The first frame of messages on PUB and XPUB sockets is
+never compressed, so subscriptions still match the topic.
+
+A compressor is any object with a one byte id, and compress(data) and
+decompress(data) methods. Register it with register() on both ends.
+"""
+import zlib
+import zmq
+
+from . import trailer
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+COMPRESSED = b"\x00spurv-compressed\x00"
+
+LOCAL_TRANSPORTS = ("inproc", "ipc")
+
+class Zlib(object):
+
+    id = b"z"
+
+    def __init__(self, level=1):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+class Lzma(object):
+    """Slower than Zlib, but compresses text better."""
+
+    id = b"x"
+
+    def __init__(self, preset=0):
+        if lzma is None:
+            raise ImportError("lzma is not available")
+        self.preset = preset
+
+    def compress(self, data):
+        return lzma.compress(data, preset=self.preset)
+
+    def decompress(self, data):
+        return lzma.decompress(data)
+
+_compressors = {}
+
+def register(compressor):
+    """Make compressor available for decompressing received frames."""
+    _compressors[compressor.id] = compressor
+
+register(Zlib())
+if lzma is not None:
+    register(Lzma())
+
+def is_compressed(frames):
+    """Whether a received message ends with a flag frame."""
+    return trailer.is_flagged(frames, COMPRESSED, 1)
+
+def decompress(frames):
+    """The frames of a received message with a flag frame, decompressed
+    and without the flag frame. Frames received without copying are
+    handed back as zmq.Frame objects."""
+    id_, flags = trailer.read(frames, COMPRESSED, 1)
+    compressor = _compressors[id_]
+    result = []
+    for frame, flag in zip(frames, flags):
+        if flag:
+            data = compressor.decompress(getattr(frame, "buffer", frame))
+            frame = zmq.Frame(data) if hasattr(frame, "buffer") else data
+        result.append(frame)
+    return result
+
+class Compression(object):
+    """Decides which frames a socket compresses."""
+
+    def __init__(self, compressor=None, threshold=1024, min_saving=0.1,
+                 max_backoff=64):
+        """Arguments:
+        - `compressor`: Zlib(), Lzma() or another compressor.
+        - `threshold`: Frames smaller than this many bytes are not
+          compressed.
+        - `min_saving`: The fraction of a frame compression must save for
+          the frame to be sent compressed.
+        - `max_backoff`: The largest number of large frames to skip
+          compressing after one that did not compress well.
+        """
+        self.compressor = compressor or Zlib()
+        self.threshold = threshold
+        self.min_saving = min_saving
+        self.max_backoff = max_backoff
+        self._backoff = 0
+        self._skip = 0
+
+    def clone(self):
+        """A Compression with the same settings and backoff of its own."""
+        return type(self)(self.compressor, self.threshold, self.min_saving,
+                          self.max_backoff)
+
+    def compress(self, frames, skip_first=False, envelope=0):
+        """The frames of a message with large frames compressed, and a
+        flag frame added if any were. The first envelope frames are left
+        alone."""
+        flags = []
+        result = list(frames[:envelope])
+        compressed = False
+        for index, frame in enumerate(frames[envelope:]):
+            flag = False
+            if len(frame) < self.threshold or (skip_first and not index):
+                pass
+            elif self._skip:
+                self._skip -= 1
+            else:
+                packed = self.compressor.compress(frame)
+                if len(packed) <= len(frame) * (1 - self.min_saving):
+                    frame, flag, compressed = packed, True, True
+                    self._backoff = 0
+                else:
+                    self._backoff = min(max(1, self._backoff * 2),
+                                        self.max_backoff)
+                    self._skip = self._backoff
+            flags.append(flag)
+            result.append(frame)
+        if not compressed:
+            return frames
+        result.append(trailer.flag_frame(COMPRESSED, flags,
+                                         self.compressor.id))
+        return result
+
+    def __repr__(self):
+        return "<Compression({0}, {1} bytes)>".format(
+            type(self.compressor).__name__, self.threshold)
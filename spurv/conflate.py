@@ -0,0 +1,123 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Keeping only the latest message per topic.
+
+A subscriber that falls behind works through every queued message, even
+when only the latest value of each topic matters. A Sub handler with
+conflate=True drains the socket first, keeps the newest message per
+topic, and only decodes and handles those:
+
+    @ctx.sub.listen("tcp://prices:5556", subs="", conflate=True)
+    def price(message):
+        ...
+
+zmq's own ZMQ_CONFLATE option does not work for multipart messages and
+keeps one message for the whole socket, not one per topic.
+
+On the publishing side, a LastValueCache remembers the latest message of
+every topic it sends, and sends those again when someone subscribes, so
+a subscriber that joins late starts out with a snapshot:
+
+    lvc = ctx.xpub.last_value_cache("tcp://*:5556")
+    lvc.send(["EURUSD", "1.0841"])
+
+The snapshot goes out on the XPUB socket like any other message, so
+subscribers that already have a topic get its latest value again.
+"""
+import collections
+import zmq
+
+from . import enc
+
+def drain_latest(socket, max_messages=1000, flags=0, copy=True):
+    """Receive up to max_messages messages from socket, the first one
+    with flags, and return the newest message of each topic as a list of
+    raw frames, oldest first. Raises zmq.Again like recv_frames if
+    flags has zmq.NOBLOCK and nothing is waiting."""
+    latest = collections.OrderedDict()
+    frames = socket.recv_frames(flags, copy)
+    count = 1
+    try:
+        while True:
+            topic = frames[0] if copy else frames[0].bytes
+            latest.pop(topic, None)
+            latest[topic] = frames
+            if count >= max_messages:
+                break
+            frames = socket.recv_frames(zmq.NOBLOCK, copy)
+            count += 1
+    except zmq.Again:
+        pass
+    return list(latest.values())
+
+class LastValueCache(object):
+    """Wraps an XPUB socket, sending the latest message of a topic to
+    new subscribers of it."""
+
+    def __init__(self, socket):
+        self.socket = socket
+        self.socket.zmqsock.setsockopt(zmq.XPUB_VERBOSE, 1)
+        self._latest = collections.OrderedDict()
+
+    @property
+    def zmqsock(self):
+        return self.socket.zmqsock
+
+    @property
+    def topics(self):
+        return list(self._latest)
+
+    def send(self, content):
+        """Answer new subscriptions, then send content, encoded like
+        Socket.send would, and remember it as the latest of its topic."""
+        self.process_subscriptions()
+        frames, _ = self.socket._encode(content, True)
+        if enc.is_bytes(frames):
+            frames = [frames]
+        self._latest[frames[0]] = frames
+        self.socket.send_frames(frames)
+
+    def process_subscriptions(self, timeout=0):
+        """Answer the subscriptions that have arrived, waiting up to
+        timeout milliseconds for the first one. Returns how many were
+        answered. send does this, but a publisher that is quiet for a
+        while should call it in the meantime."""
+        answered = 0
+        if not self.socket.zmqsock.poll(timeout):
+            return answered
+        try:
+            while True:
+                event = self.socket.zmqsock.recv(zmq.NOBLOCK)
+                if event[:1] == b"\x01":
+                    self._snapshot(event[1:])
+                    answered += 1
+        except zmq.Again:
+            pass
+        return answered
+
+    def _snapshot(self, prefix):
+        for topic, frames in self._latest.items():
+            if topic.startswith(prefix):
+                self.socket.send_frames(frames)
+
+    def forget(self, topic):
+        """Stop sending topic to new subscribers."""
+        self._latest.pop(self.socket.encode_items(topic), None)
+
+    def close(self, linger=None):
+        self.socket.close(linger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<LastValueCache({0}, {1} topics)>".format(
+            self.socket, len(self._latest))
@@ -14,44 +14,78 @@ to make it easier to get started with, but every instance has access
 to the underlying pyzmq object to enable more advanced usage if
 necessary.
 """
+import json
+import time
 import zmq
-from . import hub, enc
+from . import device, hub, enc, reactor
 
 class Spurv(enc.EncoderMixin):
     """Abstraction over a pyzmq context.
+
+    The hub and socket classes are looked up on `hub_module`, so a
+    flavour of Spurv (see spurv.aio) only needs to point that at a
+    module providing its own versions.
     """
 
-    def __init__(self, ctx=None, socket_class=hub.Socket, encoding="utf-8"):
+    hub_module = hub
+    context_class = zmq.Context
+
+    def __init__(self, ctx=None, socket_class=None, encoding="utf-8",
+                 codec=None, metrics=False, io_threads=1, options=None,
+                 tracer=None, compression=None, shared_memory=None):
         """Initialize using the provided zeromq context.
 
         Arguments:
         - `ctx`: A zeromq context.
+        - `io_threads`: The number of io threads of the context, if ctx is
+          not given.
+        - `options`: A dict of socket options set on every socket, like
+          {"linger": 0, "sndhwm": 10000}. See Hub.configure.
+        - `codec`: A codec used by every socket, see spurv.codec.
+        - `metrics`: Collect metrics for every handler, see stats().
+        - `tracer`: A trace.Tracer to trace a sample of the messages with.
+        - `compression`: A compress.Compression for sockets on transports
+          like tcp that leave the host.
+        - `shared_memory`: A shm.SharedMemory for sending large frames to
+          local processes, and receiving them from processes that have one.
         """
         super(Spurv, self).__init__()
         if ctx is None:
-            self.ctx = zmq.Context()
+            self.ctx = self.context_class(io_threads)
         else:
             self.ctx = ctx
+        self.io_threads = io_threads
+        self.shared_memory = shared_memory
+        if socket_class is None:
+            socket_class = self.hub_module.Socket
         self.encoding = encoding
         self._hubs = []
-        def make(hubcls):
-            _hub = hubcls(self.ctx, socket_class, self.encoding)
+        def make(name):
+            hubcls = getattr(self.hub_module, name)
+            _hub = hubcls(self.ctx, socket_class, self.encoding, codec)
+            _hub.collect_metrics = metrics
+            _hub.options = dict(options or {})
+            _hub.tracer = tracer
+            _hub.compression = compression
+            _hub.shared_memory = shared_memory
             self._hubs.append(_hub)
             return _hub
-        self.pub = make(hub.Pub)
-        self.sub = make(hub.Sub)
-        self.xpub = make(hub.XPub)
-        self.xsub = make(hub.XSub)
-        self.rep = make(hub.Rep)
-        self.req = make(hub.Req)
-        self.pull = make(hub.Pull)
-        self.push = make(hub.Push)
-        self.router = make(hub.Router)
-        self.dealer = make(hub.Dealer)
-        self.pair = make(hub.Pair)
+        self.pub = make("Pub")
+        self.sub = make("Sub")
+        self.xpub = make("XPub")
+        self.xsub = make("XSub")
+        self.rep = make("Rep")
+        self.req = make("Req")
+        self.pull = make("Pull")
+        self.push = make("Push")
+        self.router = make("Router")
+        self.dealer = make("Dealer")
+        self.pair = make("Pair")
 
     def destroy(self):
         self.ctx.destroy()
+        if self.shared_memory is not None:
+            self.shared_memory.close()
 
     def __enter__(self):
         return self
@@ -64,9 +98,66 @@ class Spurv(enc.EncoderMixin):
         return list(self._start(spawn))
 
     def _start(self, spawn):
+        for runner in self.runners():
+            yield spawn(runner.start)
+
+    def runners(self):
+        """What to start to serve every handler, see HandlerMixin.runners."""
         for hub in self._hubs:
-            for handler in hub.handlers:
-                yield spawn(handler.start)
+            for runner in hub.runners():
+                yield runner
+
+    def reactor(self, burst=1, timeout=100):
+        """Create a Reactor serving every registered handler from a
+        single thread. Call run() on it to start serving."""
+        return reactor.Reactor(self.runners(), burst, timeout)
+
+    def renew_context(self):
+        """Give this Spurv and its hubs a new context. A forked process
+        must not use the context of its parent, which is left alone."""
+        self.ctx = self.context_class(self.io_threads)
+        for _hub in self._hubs:
+            _hub.ctx = self.ctx
+
+    def proxy(self, frontend, backend, capture=None, sample=1, stats=False):
+        """Forward messages between two sockets, eg. XSUB and XPUB or
+        ROUTER and DEALER, in a background thread. See spurv.device.
+
+        Arguments:
+        - `capture`: A socket that gets every sample-th message.
+        - `stats`: Count the traffic, see Proxy.stats().
+        """
+        return device.Proxy(frontend, backend, capture, sample, stats).start()
+
+    def steerable_proxy(self, frontend, backend, capture=None, sample=1,
+                        stats=False):
+        """Like proxy, but it can be paused, resumed and terminated."""
+        return device.SteerableProxy(frontend, backend, capture, sample,
+                                     stats).start()
+
+    def stats(self):
+        """A snapshot of the metrics of every handler that collects them,
+        keyed by handler name."""
+        return dict((handler.name, handler.metrics.snapshot())
+                    for handler in self.handlers()
+                    if handler.metrics is not None)
+
+    def publish_stats(self, address, interval=1.0, topic="spurv.stats",
+                      bind=True):
+        """Publish stats() as json on a PUB socket every interval seconds,
+        until the context is terminated. Meant to be run using spawn."""
+        if bind:
+            socket = self.pub.bound(address)
+        else:
+            socket = self.pub.connected(address)
+        try:
+            with socket:
+                while True:
+                    message = [topic, json.dumps(self.stats())]
+                    socket.send_frames(socket.encode_items(message))
+                    time.sleep(interval)
+        except zmq.ContextTerminated:
+            pass
 
     @property
     def context(self):
@@ -0,0 +1,211 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Proxy devices that forward between two sockets.
+
+A Proxy runs zmq.proxy in a background thread. The forwarding loop is
+in libzmq and does not hold the GIL, so it is much faster than one
+written in Python. An XSUB/XPUB proxy makes a forwarder for pub/sub, a
+ROUTER/DEALER proxy makes a broker for req/rep:
+
+    proxy = ctx.proxy(ctx.xsub.bound("tcp://*:5555"),
+                      ctx.xpub.bound("tcp://*:5556"))
+
+A steerable proxy can also be paused, resumed and terminated:
+
+    proxy = ctx.steerable_proxy(ctx.router.bound("tcp://*:5555"),
+                                ctx.dealer.bound("tcp://*:5556"))
+    proxy.pause()
+    proxy.resume()
+    proxy.terminate()
+
+The proxy owns its sockets, including the capture socket, once started,
+and closes them when it stops.
+
+Capture: libzmq copies every message to the capture socket, and waits
+for it to be sent. Spurv always captures to an internal PUB socket that
+drops messages it can not keep up with, so a slow observer does not slow
+the proxy down. A thread counts the messages and bytes it sees, and
+passes every sample-th message on to the capture socket given, if any.
+Under heavy load, the counts are a sample rather than the full traffic.
+"""
+import itertools
+import threading
+import zmq
+
+_proxy_ids = itertools.count()
+
+def _raw(socket):
+    return getattr(socket, "zmqsock", socket)
+
+class Proxy(object):
+    """Forwards messages between frontend and backend in a background
+    thread, until the context is terminated."""
+
+    steerable = False
+
+    def __init__(self, frontend, backend, capture=None, sample=1,
+                 stats=False, capture_hwm=1000):
+        """Arguments:
+        - `frontend`, `backend`: Bound or connected sockets.
+        - `capture`: A socket, eg. a bound PUB socket, that gets every
+          sample-th message passed through the proxy.
+        - `stats`: Count the messages and bytes passing through the proxy,
+          see stats(). Always done when there is a capture socket.
+        - `capture_hwm`: The number of messages that can be queued for
+          capture, before messages are dropped from it.
+        """
+        if sample < 1:
+            raise ValueError("sample must be at least 1: {0}".format(sample))
+        self.frontend = frontend
+        self.backend = backend
+        self.capture = capture
+        self.sample = sample
+        self.messages = 0
+        self.bytes = 0
+        self.context = _raw(frontend).context
+        self._id = next(_proxy_ids)
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._capture_in = None
+        self._capture_out = None
+        if capture is not None or stats:
+            self._capture_out = self.context.socket(zmq.PUB)
+            self._capture_out.sndhwm = capture_hwm
+            address = "inproc://spurv-capture-{0}".format(self._id)
+            self._capture_out.bind(address)
+            self._capture_in = self.context.socket(zmq.SUB)
+            self._capture_in.rcvhwm = capture_hwm
+            self._capture_in.setsockopt(zmq.SUBSCRIBE, b"")
+            self._capture_in.connect(address)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        if self._capture_in is not None:
+            self._sampler = threading.Thread(target=self._sample)
+            self._sampler.daemon = True
+            self._sampler.start()
+        self._thread.start()
+        return self
+
+    def _proxy(self):
+        zmq.proxy(_raw(self.frontend), _raw(self.backend), self._capture_out)
+
+    def _run(self):
+        try:
+            self._proxy()
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            self._stopped.set()
+            for socket in (self.frontend, self.backend, self._capture_out):
+                if socket is not None:
+                    socket.close(0)
+
+    def _sample(self):
+        socket = self._capture_in
+        try:
+            while not self._stopped.is_set():
+                if not socket.poll(100):
+                    continue
+                frames = socket.recv_multipart(copy=False)
+                self.messages += 1
+                self.bytes += sum(len(frame) for frame in frames)
+                if self.capture is not None and self.messages % self.sample == 0:
+                    _raw(self.capture).send_multipart(frames, zmq.NOBLOCK,
+                                                      copy=False)
+        except (zmq.ContextTerminated, zmq.Again):
+            pass
+        finally:
+            socket.close(0)
+            if self.capture is not None:
+                self.capture.close(0)
+
+    def stats(self):
+        """The number of messages and bytes seen by the capture socket."""
+        return {"messages": self.messages, "bytes": self.bytes}
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def join(self, timeout=None):
+        """Wait for the proxy to stop. Returns True if it has stopped."""
+        self._thread.join(timeout)
+        if self._sampler is not None:
+            self._sampler.join(timeout)
+        return not self._thread.is_alive()
+
+    def __repr__(self):
+        return "<{0}({1} -> {2})>".format(type(self).__name__,
+                                          self.frontend, self.backend)
+
+class SteerableProxy(Proxy):
+    """A Proxy that can be paused, resumed and terminated from other
+    threads."""
+
+    steerable = True
+
+    def __init__(self, frontend, backend, capture=None, sample=1,
+                 stats=False, capture_hwm=1000):
+        super(SteerableProxy, self).__init__(frontend, backend, capture,
+                                             sample, stats, capture_hwm)
+        address = "inproc://spurv-control-{0}".format(self._id)
+        self._control = self.context.socket(zmq.PAIR)
+        self._control.bind(address)
+        self._commands = self.context.socket(zmq.PAIR)
+        self._commands.connect(address)
+        self._lock = threading.Lock()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._terminated = False
+        self.paused = False
+
+    def _proxy(self):
+        # PAUSE does not stop forwarding in every version of libzmq, so
+        # pausing stops the proxy and resuming starts it again instead.
+        # Messages queue up in the sockets in the meantime.
+        try:
+            while not self._terminated:
+                zmq.proxy_steerable(_raw(self.frontend), _raw(self.backend),
+                                    self._capture_out, self._control)
+                self._resumed.wait()
+        finally:
+            self._control.close(0)
+
+    def _command(self, command):
+        if not self._commands.closed:
+            self._commands.send(command)
+
+    def pause(self):
+        """Stop forwarding. Messages queue up in the sockets meanwhile."""
+        with self._lock:
+            if not self.paused and not self._terminated:
+                self._resumed.clear()
+                self._command(b"TERMINATE")
+                self.paused = True
+
+    def resume(self):
+        with self._lock:
+            if self.paused:
+                self.paused = False
+                self._resumed.set()
+
+    def terminate(self, timeout=None):
+        """Stop the proxy and close its sockets. Returns True if it
+        stopped within timeout seconds."""
+        with self._lock:
+            if not self._terminated:
+                self._terminated = True
+                if not self.paused:
+                    self._command(b"TERMINATE")
+                self._resumed.set()
+        joined = self.join(timeout)
+        with self._lock:
+            self._commands.close(0)
+        return joined
@@ -0,0 +1,105 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Serving several subscribers from one socket.
+
+When many Sub handlers listen on the same address, the hub groups them
+into a TopicDispatcher. It opens a single SUB socket subscribed to every
+topic the handlers want, and routes each message to the handlers whose
+subscriptions are a prefix of its first frame, using a PrefixTrie.
+Handlers that collect metrics are credited with every message routed to
+them, as if they had received it on a socket of their own.
+"""
+from . import enc
+from .metrics import clock
+
+class PrefixTrie(object):
+    """Maps byte string prefixes to values.
+
+    match(key) finds the values of every prefix of key, which is what a
+    SUB socket does with its subscriptions."""
+
+    def __init__(self):
+        self._root = ({}, [])
+
+    def add(self, prefix, value):
+        node = self._root
+        for char in prefix:
+            node = node[0].setdefault(char, ({}, []))
+        node[1].append(value)
+
+    def match(self, key):
+        """The values of every prefix of key, shortest prefix first. A
+        value stored under several matching prefixes is only returned
+        once."""
+        node = self._root
+        found = list(node[1])
+        for char in key:
+            node = node[0].get(char)
+            if node is None:
+                break
+            found.extend(value for value in node[1] if value not in found)
+        return found
+
+def subscriptions(hub, subs):
+    """The subscriptions of a handler as a list of bytes."""
+    if subs is None:
+        return []
+    subs = hub.encode_items(subs)
+    if enc.is_bytes(subs):
+        return [subs]
+    return list(subs)
+
+class TopicDispatcher(object):
+    """Serves a group of Sub handlers with the same address and bind
+    setting from one socket. It can be started and served like a
+    handler."""
+
+    concurrency = 1
+    replies = False
+
+    def __init__(self, handlers):
+        self.handlers = list(handlers)
+        first = self.handlers[0]
+        self.hub = first.hub
+        self.addr = first.addr
+        self.bind = first.bind
+        self.trie = PrefixTrie()
+        self.subs = []
+        for handler in self.handlers:
+            for sub in subscriptions(self.hub, handler.subs):
+                self.trie.add(sub, handler)
+                if sub not in self.subs:
+                    self.subs.append(sub)
+
+    def socket(self):
+        if self.bind:
+            return self.hub.bound_subscriber(self.addr, self.subs)
+        return self.hub.connected_subscriber(self.addr, self.subs)
+
+    def serve(self, socket, flags=0):
+        """Receive one message and call every handler subscribed to it.
+        With flags=zmq.NOBLOCK, raises zmq.Again if nothing is waiting."""
+        started = clock()
+        frames = socket.recv_frames(flags)
+        elapsed = clock() - started
+        for handler in self.trie.match(frames[0]):
+            if handler.metrics is not None:
+                handler.metrics.received(frames, elapsed)
+            handler.call(socket._unpack(frames, handler.decode, True))
+
+    def _start(self):
+        with self.socket() as socket:
+            while True:
+                self.serve(socket)
+
+    def start(self):
+        self._start()
+
+    def __repr__(self):
+        return "<TopicDispatcher({0}, {1} handlers)>".format(
+            self.addr, len(self.handlers))
@@ -46,9 +46,10 @@ class EncoderMixin(object):
         of string-likes or a string-like itself. It is an error to pass
         an argument that is not either a string-like or an iterable of
         string-likes."""
-        if is_string(content):
-            if is_unicode(content):
-                return content.encode(self.encoding)
-            else:
-                return content
-        return [self.encode_items(item) for item in content]
+        if is_unicode(content):
+            return content.encode(self.encoding)
+        if is_bytes(content):
+            return content
+        encoding = self.encoding
+        return [item.encode(encoding) if is_unicode(item) else item
+                for item in content]
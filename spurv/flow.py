@@ -0,0 +1,101 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Credit-based flow control for PUSH/PULL.
+
+High-water marks only bound how much each pipe buffers, and a producer
+that is faster than its consumers still fills every buffer along the
+way. With credit-based flow control, the producer may only have
+`window` messages outstanding. Consumers hand credit back on a separate
+channel as they get through their messages, and the producer waits for
+credit when it has used up its window:
+
+    producer = ctx.push.credited("tcp://*:5555", "tcp://*:5556",
+                                 bind=True, window=1000)
+    consumer = ctx.pull.credited("tcp://producer:5555",
+                                 "tcp://producer:5556", bind=False)
+
+A consumer regards a message as done when it receives the next one, and
+returns credit in chunks of `grant` messages. The window should be
+comfortably larger than grant times the number of consumers, or the
+producer will stall waiting for credit that is being held back.
+"""
+import zmq
+
+class CreditSender(object):
+    """Wraps a PUSH socket, only sending while there is credit left. The
+    credit socket is a PULL socket consumers return credit to."""
+
+    def __init__(self, socket, credit_socket, window=1000):
+        self.socket = socket
+        self.credit_socket = credit_socket
+        self.window = window
+        self.credit = window
+
+    @property
+    def zmqsock(self):
+        return self.socket.zmqsock
+
+    def _collect(self, wait):
+        if not self.credit_socket.zmqsock.poll(wait):
+            return False
+        try:
+            while True:
+                grant = self.credit_socket.zmqsock.recv(zmq.NOBLOCK)
+                self.credit += int(grant)
+        except zmq.Again:
+            pass
+        return True
+
+    def send(self, content, wait=None):
+        """Send like Socket.send, first waiting up to wait milliseconds
+        (forever if None) for credit if there is none. Raises zmq.Again
+        if no credit arrives in time."""
+        while self.credit <= 0:
+            if not self._collect(-1 if wait is None else wait):
+                raise zmq.Again()
+        self.credit -= 1
+        return self.socket.send(content)
+
+    def close(self, linger=None):
+        self.credit_socket.close(linger)
+        self.socket.close(linger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<CreditSender({0}, {1}/{2} credit)>".format(
+            self.socket, self.credit, self.window)
+
+class CreditReturner(object):
+    """Returns credit for the messages received on a PULL socket. Set it
+    as the credit of the socket, which tells it about every message."""
+
+    def __init__(self, socket, grant=100):
+        self.socket = socket
+        self.grant = grant
+        self._owed = 0
+        self._holding = False
+
+    def received(self):
+        # Receiving a message means the one before it is done with.
+        if self._holding:
+            self._owed += 1
+            if self._owed >= self.grant:
+                self.socket.zmqsock.send(str(self._owed).encode("ascii"))
+                self._owed = 0
+        self._holding = True
+
+    def close(self, linger=None):
+        self.socket.close(linger)
+
+    def __repr__(self):
+        return "<CreditReturner({0}, {1} owed)>".format(self.socket, self._owed)
@@ -7,7 +7,14 @@
 """
 Registering and starting handlers on sockets.
 """
+import zmq
+
+from . import conflate, enc, workers
+from .cache import request_key
 from .enc import is_string
+from .metrics import Metrics, clock
+
+BATCH_SIZE = 1000
 
 def reply_forever(socket, handler, decode=True):
     with socket:
@@ -24,32 +31,210 @@ def listen_forever(socket, handler, decode=True):
 
 class Handler(object):
 
-    def __init__(self, hub, addr, fn, bind, decode, subs=None):
+    def __init__(self, hub, addr, fn, bind, decode, subs=None, batch=False,
+                 copy=True, concurrency=1, workers="thread", codec=None,
+                 metrics=None, sockopts=None, credit=None, grant=100,
+                 cache=None, invalidate=None, invalidate_topic="",
+                 conflate=False, admission=None):
+        """Arguments:
+        - `batch`: If true, fn receives a list of every message that was
+          queued on the socket instead of one message per call. May be an
+          int to limit the length of the list, True means BATCH_SIZE.
+        - `copy`: If false, messages are received without copying and fn
+          gets lazily decoded message.Message objects.
+        - `concurrency`: If more than 1, fn is served by this many workers
+          behind a ROUTER socket, see workers.WorkerPool.
+        - `workers`: The kind of worker to use, "thread" or "process".
+        - `codec`: A codec for the sockets of this handler, overriding the
+          one set on the hub. See spurv.codec.
+        - `metrics`: Whether to collect metrics.Metrics for this handler,
+          defaults to the collect_metrics setting of the hub.
+        - `sockopts`: A dict of socket options, see Hub.configure.
+        - `credit`: The address to return credit to, see spurv.flow.
+        - `grant`: How many messages to return credit for at a time.
+        - `cache`: A cache.LRU for the replies of fn, see spurv.cache.
+        - `invalidate`: An address to subscribe to for invalidating the
+          cache, with the subscription `invalidate_topic`.
+        - `conflate`: If true, only the newest of the queued messages of
+          each topic is handled, see spurv.conflate.
+        - `admission`: An admission.Admission deciding which messages to
+          shed when the handler is overloaded, see spurv.admission. It
+          can not be combined with batch or conflate, which keep up by
+          handling messages together or skipping them instead.
+        """
+        if admission is not None and (batch or conflate):
+            raise ValueError("admission can not be combined with batch or "
+                             "conflate")
         self.addr = addr
         self.hub = hub
         self.fn = fn
         self.bind = bind
         self.decode = decode
         self.subs = subs
+        self.batch = BATCH_SIZE if batch is True else batch
+        self.copy = copy
+        self.concurrency = concurrency
+        self.workers = workers
+        self.codec = codec
+        if metrics is None:
+            metrics = hub.collect_metrics
+        self.metrics = Metrics() if metrics else None
+        self.sockopts = sockopts or {}
+        self.credit = credit
+        self.grant = grant
+        self.cache = cache
+        self.invalidate = invalidate
+        self.invalidate_topic = invalidate_topic
+        self.conflate = conflate
+        self.admission = admission
+
+    @property
+    def name(self):
+        return "{0}:{1}".format(self.hub.__class__.__name__.lower(),
+                                self.fn.__name__)
+
+    @property
+    def replies(self):
+        """Whether the return value of fn is sent back on the socket."""
+        return self.hub.replies
+
+    @property
+    def shareable(self):
+        """Whether this handler can be served from a socket shared with
+        other handlers, see spurv.dispatch."""
+        return (not self.batch and self.copy and self.codec is None and
+                self.concurrency == 1 and not self.sockopts and
+                self.credit is None and not self.conflate and
+                self.admission is None)
 
     def socket(self):
         if self.bind:
             if self.subs is not None:
-                return self.hub.bound_subscriber(self.addr, self.subs)
+                socket = self.hub.bound_subscriber(self.addr, self.subs,
+                                                   **self.sockopts)
             else:
-                return self.hub.bound(self.addr)
+                socket = self.hub.bound(self.addr, **self.sockopts)
         else:
             if self.subs is not None:
-                return self.hub.connected_subscriber(self.addr, self.subs)
+                socket = self.hub.connected_subscriber(self.addr, self.subs,
+                                                       **self.sockopts)
             else:
-                return self.hub.connected(self.addr)
+                socket = self.hub.connected(self.addr, **self.sockopts)
+        if self.credit is not None:
+            self.hub.return_credit(socket, self.credit, self.grant)
+        self.follow()
+        return self.prepare(socket)
 
-    def _start(self):
-        socket = self.socket()
-        if self.subs is not None:
-            listen_forever(socket, self.fn, self.decode)
+    def follow(self, context=None):
+        """Start dropping cached replies as told to on the invalidate
+        address, if this handler has one, using context or the context
+        of the hub."""
+        if self.cache is not None and self.invalidate is not None:
+            self.cache.follow(context or self.hub.context, self.invalidate,
+                              self.hub.encode_items(self.invalidate_topic))
+
+    def prepare(self, socket):
+        """Apply the settings of this handler to a socket it serves."""
+        if self.codec is not None:
+            socket.codec = self.codec
+        socket.metrics = self.metrics
+        return socket
+
+    def serve(self, socket, flags=0):
+        """Receive one message on socket, hand it to fn and send back the
+        reply if this handler replies. With flags=zmq.NOBLOCK, this raises
+        zmq.Again when there is nothing to receive."""
+        if self.conflate:
+            return self._serve_conflated(socket, flags)
+        if self.admission is not None or (self.cache is not None and
+                                          not self.batch):
+            return self._serve_frames(socket, flags)
+        if self.batch:
+            max_wait = 0 if flags & zmq.NOBLOCK else None
+            message = socket.recv_batch(self.batch, max_wait, self.decode,
+                                        self.copy)
+            if not message:
+                raise zmq.Again()
         else:
-            reply_forever(socket, self.fn, self.decode)
+            message = socket.recv(decode=self.decode, flags=flags,
+                                  copy=self.copy)
+        result = self.call(message)
+        if self.replies:
+            socket.send(result)
+
+    def _serve_frames(self, socket, flags):
+        copy = self.copy if socket.codec is None else socket.codec.copy
+        if self.admission is not None:
+            self.admission.before_receive(socket)
+        frames = socket.recv_frames(flags, copy)
+        if self.admission is not None and not self.admission.admit():
+            if self.replies:
+                socket.send(self.admission.reject)
+            return
+        if self.cache is None:
+            result = self.call(socket._unpack(frames, self.decode, copy))
+            if self.replies:
+                socket.send(result)
+            return
+        key = request_key(frames if copy else [f.buffer for f in frames])
+        reply = self.cache.get(key)
+        if reply is None:
+            result = self.call(socket._unpack(frames, self.decode, copy))
+            reply, _ = socket._encode(result, True)
+            if not enc.is_bytes(reply):
+                reply = [frame if enc.is_bytes(frame) else bytes(frame)
+                         for frame in reply]
+            self.cache.put(key, reply)
+        socket.send_frames(reply)
+
+    def _serve_conflated(self, socket, flags):
+        copy = self.copy if socket.codec is None else socket.codec.copy
+        latest = conflate.drain_latest(socket, self.batch or BATCH_SIZE,
+                                       flags, copy)
+        messages = [socket._unpack(frames, self.decode, copy)
+                    for frames in latest]
+        if self.batch:
+            self.call(messages)
+        else:
+            for message in messages:
+                self.call(message)
+
+    def call(self, message):
+        """Call fn with message, recording metrics if enabled, and the
+        span of the message if it is traced."""
+        tracer = self.hub.tracer
+        span = None if tracer is None else tracer.current()
+        if self.metrics is None and span is None:
+            return self.fn(message)
+        started = self._begin(span)
+        try:
+            return self.fn(message)
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.failed()
+            raise
+        finally:
+            self._finish(span, started)
+
+    def _begin(self, span):
+        if span is not None:
+            self.hub.tracer.begin(span)
+        return clock()
+
+    def _finish(self, span, started):
+        elapsed = clock() - started
+        if self.metrics is not None:
+            self.metrics.handled(elapsed)
+        if span is not None:
+            self.hub.tracer.finish(span, self.name, elapsed)
+
+    def _start(self):
+        if self.concurrency > 1:
+            pool = workers.WorkerPool(self, self.concurrency, self.workers)
+            return pool.run()
+        with self.socket() as socket:
+            while True:
+                self.serve(socket)
 
     def start(self):
         self._start()
@@ -60,6 +245,11 @@ class Handler(object):
 
 class HandlerMixin(object):
 
+    handler_class = Handler
+    replies = False
+    collect_metrics = False
+    tracer = None
+
     def __init__(self):
         self._handlers = []
         self._addr_mapping = {}
@@ -69,6 +259,11 @@ class HandlerMixin(object):
     def handlers(self):
         return self._handlers
 
+    def runners(self):
+        """The things to start or serve to serve every handler. These
+        are the handlers themselves unless a hub groups them."""
+        return list(self.handlers)
+
     @property
     def name_mapping(self):
         return self._name_mapping
@@ -87,9 +282,10 @@ class HandlerMixin(object):
         handler = self.handler_by_name(name)
         return handler.addr
 
-    def _add_handler(self, addr, bind, decode, fn, subs=None):
-        handler = Handler(hub=self, addr=addr, bind=bind,
-                          decode=decode, fn=fn, subs=subs)
+    def _add_handler(self, addr, bind, decode, fn, **options):
+        """Register fn, see Handler for the options."""
+        handler = self.handler_class(hub=self, addr=addr, bind=bind,
+                                     decode=decode, fn=fn, **options)
         self.handlers.append(handler)
         self.addr_mapping[addr] = handler
         self.name_mapping[fn.__name__] = handler
@@ -8,10 +8,21 @@
 Abstractions for creating ZMQ sockets of various type and some
 configuration hooks / decorators.
 """
+import collections
 import functools
+import threading
 import zmq
 
-from . import enc, handler
+from . import buffer, compress, conflate, dispatch, enc, flow, handler
+from . import message, metrics, pool, reliable, rpc, shm, spill, trailer
+
+# The socket options configure accepts, by their lower case names.
+SOCKET_OPTIONS = frozenset([
+    "sndhwm", "rcvhwm", "sndbuf", "rcvbuf", "linger", "immediate",
+    "tcp_keepalive", "tcp_keepalive_cnt", "tcp_keepalive_idle",
+    "tcp_keepalive_intvl", "heartbeat_ivl", "heartbeat_timeout",
+    "heartbeat_ttl",
+])
 
 class Socket(enc.EncoderMixin):
     """An abstraction on a zmq socket to differentiate socket types.
@@ -48,25 +59,94 @@ class Socket(enc.EncoderMixin):
         """This is only valid for TCP sockets."""
         return self._port
 
-    def __init__(self, zmqsock, encoding="utf-8", port=None):
+    def __init__(self, zmqsock, encoding="utf-8", port=None, codec=None):
         super(Socket, self).__init__()
         self._zmqsock = zmqsock
         self.encoding = encoding
+        self.codec = codec
+        self.metrics = None
+        self.tracer = None
+        self.credit = None
+        self.compression = None
+        self.shared_memory = None
         self._connected = False
         self._port = port
+        self._remote = False
+        self._unpacked = collections.deque()
+
+    @property
+    def pending(self):
+        """The number of messages that have been received as part of a
+        packed message (see spurv.buffer), but not yet handed out."""
+        return len(self._unpacked)
 
     def send(self, content, flags=0, copy=True, track=False):
         """This accepts unicode and will use the encoding set on this
         socket if it is necessary to encode.
 
         It will also accept iterables that are not string-types, if so
-        they are sent as multipart messages."""
-
-        encoded = self.encode_items(content)
-        if enc.is_bytes(encoded):
-            return self.zmqsock.send(encoded, flags, copy, track)
+        they are sent as multipart messages.
+
+        If this socket has a codec, content is encoded by the codec
+        instead, see spurv.codec."""
+
+        frames, copy = self._encode(content, copy)
+        return self.send_frames(frames, flags, copy, track)
+
+    def send_frames(self, frames, flags=0, copy=True, track=False):
+        """Send a message that is already encoded, either bytes or a list
+        of bytes-likes."""
+        frames = self._outgoing(frames)
+        if self.metrics is None:
+            return self._send_frames(frames, flags, copy, track)
+        started = metrics.clock()
+        tracker = self._send_frames(frames, flags, copy, track)
+        self.metrics.sent(frames, metrics.clock() - started)
+        return tracker
+
+    def _outgoing(self, frames):
+        # Compression, shared memory and tracing, in the order receivers
+        # undo them in _incoming.
+        if self.compression is not None and self._remote:
+            frames = self._compressed(frames)
+        elif self.shared_memory is not None and not self._remote:
+            frames = self._shared(frames)
+        if self.tracer is not None:
+            frames = self._traced(frames)
+        return frames
+
+    def _compressed(self, frames):
+        if enc.is_bytes(frames):
+            frames = [frames]
+        skip_first = self.zmqsock.type in (zmq.PUB, zmq.XPUB)
+        envelope = trailer.envelope(self.zmqsock.type, frames)
+        return self.compression.compress(frames, skip_first, envelope)
+
+    def _shared(self, frames):
+        if enc.is_bytes(frames):
+            frames = [frames]
+        fan_out = self.zmqsock.type in shm.FAN_OUT
+        envelope = trailer.envelope(self.zmqsock.type, frames)
+        return self.shared_memory.share(frames, fan_out, envelope)
+
+    def _traced(self, frames):
+        frame = self.tracer.outgoing()
+        if frame is None:
+            return frames
+        if enc.is_bytes(frames):
+            return [frames, frame]
+        return list(frames) + [frame]
+
+    def _send_frames(self, frames, flags, copy, track):
+        if enc.is_bytes(frames):
+            return self.zmqsock.send(frames, flags, copy, track)
         else:
-            return self.zmqsock.send_multipart(encoded, flags, copy, track)
+            return self.zmqsock.send_multipart(frames, flags, copy, track)
+
+    def _encode(self, content, copy):
+        if self.codec is not None:
+            return self.codec.encode(content), copy and self.codec.copy
+        return self.encode_items(content), copy
 
     def recv(self, decode=False, flags=0, copy=True, track=False):
         """This receives using multipart reception, returning all parts of the
@@ -74,9 +154,88 @@ class Socket(enc.EncoderMixin):
 
         If decode is specified, it may be either an iterable specifying which
         parts of the message to decode or it may simply be True to decode all parts.
+
+        If copy is False, the message is received without copying it out of
+        zmq and a message.Message is returned instead of a list. It decodes
+        parts lazily and hands out the parts that are not decoded as
+        memoryviews.
+
+        If this socket has a codec, decode and copy are ignored and the
+        message is decoded by the codec instead.
         """
 
-        items = self.zmqsock.recv_multipart(flags, copy, track)
+        if self.codec is not None:
+            copy = self.codec.copy
+        items = self.recv_frames(flags, copy, track)
+        return self._unpack(items, decode, copy)
+
+    def recv_frames(self, flags=0, copy=True, track=False):
+        """Receive a message as a list of raw frames, without decoding.
+
+        Packed messages, see spurv.buffer, are unpacked and the messages
+        in them handed out one by one."""
+        if self._unpacked:
+            return self._unpacked.popleft()
+        if self.metrics is None:
+            items = self.zmqsock.recv_multipart(flags, copy, track)
+        else:
+            started = metrics.clock()
+            items = self.zmqsock.recv_multipart(flags, copy, track)
+            self.metrics.received(items, metrics.clock() - started)
+        return self._incoming(items, copy)
+
+    def _incoming(self, items, copy):
+        if self.credit is not None:
+            self.credit.received()
+        if self.tracer is not None:
+            items = self.tracer.incoming(items)
+        if compress.is_compressed(items):
+            items = compress.decompress(items)
+        elif (self.shared_memory is not None and not self._remote and
+              shm.is_shared(items)):
+            unlink = self.zmqsock.type not in (zmq.SUB, zmq.XSUB)
+            items = shm.receive(items, unlink, copy)
+        if buffer.is_packed(items):
+            return self._unpack_packed(items, copy)
+        return items
+
+    def _unpack_packed(self, items, copy):
+        topic, _, data = items
+        if not copy:
+            topic, data = topic.buffer, data.buffer
+        messages = [[topic] + frames for frames in buffer.unpack(data)]
+        self._unpacked.extend(messages[1:])
+        return messages[0]
+
+    def _unpack(self, items, decode, copy):
+        if self.codec is not None:
+            return self.codec.decode(items)
+        if not copy:
+            return message.Message(items, decode, self.encoding)
+        return self._decode(items, decode)
+
+    def recv_batch(self, max_messages=1000, max_wait=None, decode=False,
+                   copy=True, track=False):
+        """Receive up to max_messages messages in one go.
+
+        This waits up to max_wait milliseconds (forever if None) for a
+        message to arrive, then drains whatever else is already queued
+        without blocking. Returns a list of messages, each like the
+        return value of recv. The list is empty if max_wait passes
+        without anything arriving.
+        """
+        if (max_wait is not None and not self._unpacked and
+                not self.zmqsock.poll(max_wait)):
+            return []
+        batch = [self.recv(decode, 0, copy, track)]
+        try:
+            while len(batch) < max_messages:
+                batch.append(self.recv(decode, zmq.NOBLOCK, copy, track))
+        except zmq.Again:
+            pass
+        return batch
+
+    def _decode(self, items, decode):
         if not decode:
             return items
         try:
@@ -89,6 +248,8 @@ class Socket(enc.EncoderMixin):
                     for index, item in enumerate(items)]
 
     def close(self, linger=None):
+        if self.credit is not None:
+            self.credit.close(linger)
         self.zmqsock.close(linger)
         self._connected = False
 
@@ -109,6 +270,9 @@ class Socket(enc.EncoderMixin):
         self._connected = True
 
     def _update_port(self, address):
+        transport = address.split("://", 1)[0]
+        if transport not in compress.LOCAL_TRANSPORTS:
+            self._remote = True
         if address.startswith("tcp://"):
             port = address.split(":")[-1]
             try:
@@ -118,6 +282,7 @@ class Socket(enc.EncoderMixin):
 
     def bind_to_random_port(self, address, min_port=49152, max_port=65536, tries=100):
         port = self.zmqsock.bind_to_random_port(address, min_port, max_port, tries)
+        self._update_port(address)
         self._connected = True
         self._port = port
         return port
@@ -141,14 +306,42 @@ class Hub(enc.EncoderMixin, handler.HandlerMixin):
     def context(self):
         return self.ctx
 
-    def __init__(self, ctx, socket_class=Socket, encoding="utf-8"):
+    def __init__(self, ctx, socket_class=Socket, encoding="utf-8", codec=None):
         super(Hub, self).__init__()
         self.ctx = ctx
         self.encoding = encoding
         self.socket_class = socket_class
+        self.codec = codec
+        self.options = {}
+        self.tracer = None
+        self.compression = None
+        self.shared_memory = None
 
     def _wrap(self, socket):
-        return self.socket_class(socket, encoding=self.encoding)
+        socket = self.socket_class(socket, encoding=self.encoding,
+                                   codec=self.codec)
+        socket.tracer = self.tracer
+        if self.compression is not None:
+            socket.compression = self.compression.clone()
+        socket.shared_memory = self.shared_memory
+        return self.configure(socket, **self.options)
+
+    def configure(self, socket, **options):
+        """Set zmq socket options on socket by their lower case names, eg.
+        configure(socket, sndhwm=1000, linger=0). Only the high-water
+        mark, buffer size, linger, immediate, tcp keepalive and heartbeat
+        options in SOCKET_OPTIONS are accepted, others raise ValueError."""
+        for name, value in options.items():
+            if name not in SOCKET_OPTIONS:
+                raise ValueError("Unsupported socket option: {0}, see "
+                                 "hub.SOCKET_OPTIONS".format(name))
+            try:
+                option = getattr(zmq, name.upper())
+            except AttributeError:
+                raise ValueError("Socket option {0} is not supported by this "
+                                 "version of zmq".format(name))
+            socket.zmqsock.setsockopt(option, value)
+        return socket
 
     def _socket(self, socktype):
         return self.context.socket(socktype)
@@ -166,39 +359,110 @@ class Hub(enc.EncoderMixin, handler.HandlerMixin):
             for sub in subs:
                 sock.zmqsock.setsockopt(zmq.SUBSCRIBE, sub)
 
-    def bound(self, address, random_port=False):
-        """Ask this hub for a socket bound to an address."""
-        socket = self.socket()
+    def bound(self, address, random_port=False, **options):
+        """Ask this hub for a socket bound to an address. Keyword arguments
+        are socket options, see configure."""
+        socket = self.configure(self.socket(), **options)
         if random_port:
             socket.bind_to_random_port(address)
         else:
             socket.bind(address)
         return socket
 
-    def connected(self, address):
-        """Ask this hub for a socket connected to an address."""
-        socket = self.socket()
+    def connected(self, address, **options):
+        """Ask this hub for a socket connected to an address. Keyword
+        arguments are socket options, see configure."""
+        socket = self.configure(self.socket(), **options)
         socket.connect(address)
         return socket
 
-class Pub(Hub):
+class Buffering(object):
+    """Adds buffered sockets to a hub of a sending socket type."""
+
+    buffered_class = buffer.BufferedSocket
+
+    def buffered(self, address, bind=True, max_count=1000, max_bytes=65536,
+                 max_delay=10, pack=False):
+        """Ask this hub for a buffer.BufferedSocket bound or connected to
+        an address. See spurv.buffer for the arguments."""
+        if bind:
+            socket = self.bound(address)
+        else:
+            socket = self.connected(address)
+        return self.buffered_class(socket, max_count, max_bytes, max_delay,
+                                   pack)
+
+class Reliability(object):
+    """Adds reliable clients to the REQ and DEALER hubs."""
+
+    def reliable(self, endpoints, timeout=2500, retries=3, heartbeat=None,
+                 **kwargs):
+        """Create a reliable.ReliableClient, which sends requests to one
+        of endpoints and retries on the others when no reply arrives in
+        time milliseconds. See spurv.reliable for the other arguments."""
+        return reliable.ReliableClient(self, endpoints, timeout, retries,
+                                       heartbeat=heartbeat, **kwargs)
+
+class Pub(Hub, Buffering):
     """Hub for creating sockets of the PUB type."""
 
     def socket(self):
         return self._wrap(self._socket(zmq.PUB))
 
-class Req(Hub):
+class Req(Hub, Reliability):
+
+    def __init__(self, *args, **kwargs):
+        super(Req, self).__init__(*args, **kwargs)
+        self._pools = {}
+        self._pools_lock = threading.Lock()
 
     def socket(self):
         return self._wrap(self._socket(zmq.REQ))
 
+    def pool(self, address, max_size=8):
+        """The pool.SocketPool of sockets connected to address, created
+        with max_size the first time it is asked for."""
+        with self._pools_lock:
+            try:
+                return self._pools[address]
+            except KeyError:
+                self._pools[address] = pool.SocketPool(self, address, max_size)
+                return self._pools[address]
+
+    def request(self, address, message, timeout=None, decode=False):
+        """Send message to address on a pooled socket and return the reply,
+        see pool.SocketPool.request."""
+        return self.pool(address).request(message, timeout, decode)
+
 class Rep(Hub, handler.HandlerMixin):
 
+    replies = True
+
     def socket(self):
         return self._wrap(self._socket(zmq.REP))
 
-    def listen(self, addr, decode=True, bind=True):
-        return functools.partial(self._add_handler, addr, bind, decode)
+    def listen(self, addr, decode=True, bind=True, copy=True, concurrency=1,
+               workers="thread", codec=None, cache=None, invalidate=None,
+               invalidate_topic="", admission=None, metrics=None,
+               **sockopts):
+        """Register a function to reply to requests on addr.
+
+        With concurrency=N, N workers ("thread" or "process") serve the
+        function behind a ROUTER socket on addr, so slow requests don't
+        hold up other clients. With cache=cache.LRU(...), replies to
+        repeated requests are served from the cache, see spurv.cache.
+        With admission=admission.Admission(...), requests are rejected
+        with a fast reply when the handler is overloaded. With
+        metrics=True, the handler collects metrics even if the Spurv does
+        not. Other keyword arguments are socket options, see
+        Hub.configure."""
+        return functools.partial(self._add_handler, addr, bind, decode,
+                                 copy=copy, concurrency=concurrency,
+                                 workers=workers, codec=codec, cache=cache,
+                                 invalidate=invalidate,
+                                 invalidate_topic=invalidate_topic,
+                                 admission=admission, metrics=metrics,
+                                 sockopts=sockopts)
 
     def start(self, spawn):
         return self.start_handling(spawn, handler.reply_forever)
@@ -208,39 +472,132 @@ class Router(Hub):
     def socket(self):
         return self._wrap(self._socket(zmq.ROUTER))
 
-class Dealer(Hub):
+class Dealer(Hub, Reliability):
 
     def socket(self):
         return self._wrap(self._socket(zmq.DEALER))
 
-class Pull(Hub):
+    def client(self, address, decode=False):
+        """Create an rpc.Client, which keeps any number of requests to
+        address in flight on one DEALER socket."""
+        return rpc.Client(self, address, decode)
+
+class Pull(Hub, handler.HandlerMixin):
 
     def socket(self):
         return self._wrap(self._socket(zmq.PULL))
 
-class Push(Hub):
+    def listen(self, addr, bind=True, decode=True, batch=False, copy=True,
+               codec=None, credit=None, grant=100, admission=None,
+               metrics=None, **sockopts):
+        """Register a function to handle messages pulled from addr.
+
+        With credit set to the address of the credit socket of a
+        flow.CreditSender, credit is returned to it for every grant
+        messages handled. With admission, messages are dropped or sampled
+        when the handler is overloaded, see spurv.admission. With
+        metrics=True, the handler collects metrics even if the Spurv does
+        not."""
+        return functools.partial(self._add_handler, addr, bind, decode,
+                                 batch=batch, copy=copy, codec=codec,
+                                 credit=credit, grant=grant,
+                                 admission=admission, metrics=metrics,
+                                 sockopts=sockopts)
+
+    def credited(self, address, credit_address, bind=True, grant=100,
+                 **options):
+        """Ask this hub for a socket that returns credit to the
+        flow.CreditSender with its credit socket at credit_address."""
+        if bind:
+            socket = self.bound(address, **options)
+        else:
+            socket = self.connected(address, **options)
+        return self.return_credit(socket, credit_address, grant)
+
+    def return_credit(self, socket, credit_address, grant=100):
+        """Make socket return credit to credit_address, see spurv.flow."""
+        returner = self._wrap(self._socket(zmq.PUSH))
+        returner.connect(credit_address)
+        socket.credit = flow.CreditReturner(returner, grant)
+        return socket
+
+class Push(Hub, Buffering):
 
     def socket(self):
         return self._wrap(self._socket(zmq.PUSH))
 
+    def credited(self, address, credit_address, bind=False, window=1000,
+                 **options):
+        """Ask this hub for a flow.CreditSender, which never has more than
+        window messages outstanding. Consumers return credit to a PULL
+        socket bound to credit_address."""
+        if bind:
+            socket = self.bound(address, **options)
+        else:
+            socket = self.connected(address, **options)
+        credits = self._wrap(self._socket(zmq.PULL))
+        credits.bind(credit_address)
+        return flow.CreditSender(socket, credits, window)
+
+    def spilling(self, address, directory, bind=False,
+                 segment_size=64 * 1024 * 1024, **options):
+        """Ask this hub for a spill.SpillingSocket bound or connected to
+        an address, which spills what it can not send right away to
+        segment files in directory."""
+        if bind:
+            socket = self.bound(address, **options)
+        else:
+            socket = self.connected(address, **options)
+        return spill.SpillingSocket(socket, directory, segment_size)
+
 class Sub(Hub, handler.HandlerMixin):
     """Hub for creating sockets of the SUB type."""
 
     def socket(self):
         return self._wrap(self._socket(zmq.SUB))
 
-    def connected_subscriber(self, address, subscriptions=''):
-        socket = self.connected(address)
+    def connected_subscriber(self, address, subscriptions='', **options):
+        socket = self.connected(address, **options)
         self._subscribe(socket, subscriptions)
         return socket
 
-    def bound_subscriber(self, address, subscriptions=''):
-        socket = self.bound(address)
+    def bound_subscriber(self, address, subscriptions='', **options):
+        socket = self.bound(address, **options)
         self._subscribe(socket, subscriptions)
         return socket
 
-    def listen(self, addr, bind=False, decode=True, subs=None):
-        return functools.partial(self._add_handler, addr, bind, decode, subs=subs)
+    def listen(self, addr, bind=False, decode=True, subs=None, batch=False,
+               copy=True, codec=None, conflate=False, admission=None,
+               metrics=None, **sockopts):
+        """Register a function to handle messages published on addr.
+
+        With conflate=True, only the newest queued message of each topic
+        is handled, see spurv.conflate. With admission, messages are
+        dropped or sampled when the handler is overloaded, see
+        spurv.admission. With metrics=True, the handler collects metrics
+        even if the Spurv does not."""
+        return functools.partial(self._add_handler, addr, bind, decode,
+                                 subs=subs, batch=batch, copy=copy,
+                                 codec=codec, conflate=conflate,
+                                 admission=admission, metrics=metrics,
+                                 sockopts=sockopts)
+
+    def runners(self):
+        """Handlers listening on the same address share a socket through
+        a dispatch.TopicDispatcher, unless they use options that need a
+        socket of their own."""
+        shareable = [h for h in self.handlers if h.shareable]
+        sharing = collections.Counter((h.addr, h.bind) for h in shareable)
+        runners, dispatchers = [], {}
+        for handler in self.handlers:
+            key = (handler.addr, handler.bind)
+            if not handler.shareable or sharing[key] == 1:
+                runners.append(handler)
+            elif key not in dispatchers:
+                dispatchers[key] = dispatch.TopicDispatcher(
+                    [h for h in shareable if (h.addr, h.bind) == key])
+                runners.append(dispatchers[key])
+        return runners
 
     def start(self, spawn):
         return self.start_handling(spawn, handler.listen_forever)
@@ -250,6 +607,16 @@ class XPub(Hub):
     def socket(self):
         return self._wrap(self._socket(zmq.XPUB))
 
+    def last_value_cache(self, address, bind=True, **options):
+        """Ask this hub for a conflate.LastValueCache bound or connected
+        to an address, which sends new subscribers the latest message of
+        the topics they subscribe to."""
+        if bind:
+            socket = self.bound(address, **options)
+        else:
+            socket = self.connected(address, **options)
+        return conflate.LastValueCache(socket)
+
 class XSub(Hub):
 
     def socket(self):
@@ -0,0 +1,83 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Lazily decoded messages received without copying.
+"""
+from . import enc
+
+class Message(object):
+    """A multipart message backed by the zmq.Frame objects it was
+    received as.
+
+    It behaves like the list returned by Socket.recv, except that no
+    frame is copied out of zmq: parts that are not decoded are handed
+    out as memoryviews on the frame, and parts that are decoded are
+    only decoded the first time they are accessed. Reading the header
+    of a message with a large binary body is therefore cheap.
+
+    The frames themselves are available as the property frames.
+    """
+
+    def __init__(self, frames, decode=False, encoding="utf-8"):
+        self._frames = frames
+        self._decoded = {}
+        self.decode = decode
+        self.encoding = encoding
+
+    @property
+    def frames(self):
+        return self._frames
+
+    def decodes(self, index):
+        """Whether the part at index is handed out as a string."""
+        if self.decode is True:
+            return True
+        if not self.decode:
+            return False
+        return index in self.decode
+
+    def buffer(self, index):
+        """A memoryview on the part at index, regardless of decode."""
+        frame = self._frames[index]
+        try:
+            return frame.buffer
+        except AttributeError:
+            return memoryview(frame)
+
+    def bytes(self, index):
+        """A copy of the part at index as bytes."""
+        return self.buffer(index).tobytes()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not self.decodes(index):
+            return self.buffer(index)
+        try:
+            return self._decoded[index]
+        except KeyError:
+            decoded = enc.u(self.buffer(index), self.encoding)
+            self._decoded[index] = decoded
+            return decoded
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "<Message({0} parts)>".format(len(self))
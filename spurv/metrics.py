@@ -0,0 +1,122 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Cheap counters and latency histograms for handlers and sockets.
+
+A Metrics object is attached to every handler of a Spurv created with
+metrics=True, and to the sockets the handler serves. It counts messages
+and bytes in each direction, errors raised by the handler, time spent
+blocking in send and recv, and keeps a histogram of the time spent in
+the handler function. Recording a sample costs a few additions and a
+bisect, so it is fine to leave on.
+
+Counters are not protected by locks, a handler served by several
+threads may lose the odd increment.
+"""
+import bisect
+import time
+
+clock = getattr(time, "perf_counter", time.time)
+
+def _default_bounds():
+    # 1µs, 2µs, 4µs ... ~67s
+    return [1e-6 * 2 ** i for i in range(27)]
+
+class Histogram(object):
+    """Counts samples, in seconds, in buckets with exponentially growing
+    upper bounds. The last bucket counts everything above the largest
+    bound."""
+
+    def __init__(self, bounds=None):
+        self.bounds = _default_bounds() if bounds is None else list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """An upper bound on the given percentile of the samples."""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if index < len(self.bounds):
+            return min(self.bounds[index], self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+def _size(frames):
+    if isinstance(frames, (list, tuple)):
+        return sum(len(frame) for frame in frames)
+    return len(frames)
+
+class Metrics(object):
+    """Counters for one handler and the sockets it serves."""
+
+    def __init__(self):
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0
+        self.recv_time = 0.0
+        self.send_time = 0.0
+        self.handler_time = Histogram()
+
+    def received(self, frames, elapsed):
+        self.messages_in += 1
+        self.bytes_in += _size(frames)
+        self.recv_time += elapsed
+
+    def sent(self, frames, elapsed):
+        self.messages_out += 1
+        self.bytes_out += _size(frames)
+        self.send_time += elapsed
+
+    def handled(self, elapsed):
+        self.handler_time.add(elapsed)
+
+    def failed(self):
+        self.errors += 1
+
+    def snapshot(self):
+        """A dict of the current values, suitable for json."""
+        return {
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "errors": self.errors,
+            "recv_time": self.recv_time,
+            "send_time": self.send_time,
+            "handler_time": self.handler_time.snapshot(),
+        }
+
+    def __repr__(self):
+        return "<Metrics({0} in, {1} out, {2} errors)>".format(
+            self.messages_in, self.messages_out, self.errors)
@@ -0,0 +1,131 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Pooling connected REQ sockets.
+
+Connecting a socket for every request means paying for the connection
+handshake every time. A SocketPool keeps connected sockets around and
+lends them out to one thread at a time:
+
+    pool = ctx.req.pool("tcp://localhost:5555", max_size=8)
+    reply = pool.request(["lookup", key], timeout=1000, decode=True)
+
+A REQ socket that has sent a request without receiving the reply can
+not be used for anything else, so sockets that time out, or that are
+returned because of an exception, are closed instead of reused.
+"""
+import contextlib
+import threading
+import time
+
+class RequestTimeout(Exception):
+    """No reply arrived in time."""
+
+class SocketPool(object):
+    """A thread-safe pool of up to max_size sockets connected to one
+    address. Idle sockets are handed out most recently used first."""
+
+    def __init__(self, hub, address, max_size=8):
+        self.hub = hub
+        self.address = address
+        self.max_size = max_size
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def size(self):
+        """The number of sockets, idle or checked out."""
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def checkout(self, wait=None):
+        """Take a socket from the pool, connecting a new one if none are
+        idle and the pool is not full. If the pool is full, wait up to
+        wait milliseconds (forever if None) for a socket to be returned,
+        raising RequestTimeout if none is."""
+        deadline = None if wait is None else time.time() + wait / 1000.0
+        with self._condition:
+            while not self._idle and self._size >= self.max_size:
+                if self._closed:
+                    raise ValueError("Pool is closed")
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise RequestTimeout("No socket available for {0}".format(
+                        self.address))
+                self._condition.wait(remaining)
+            if self._closed:
+                raise ValueError("Pool is closed")
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+        try:
+            return self.hub.connected(self.address)
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def checkin(self, socket, broken=False):
+        """Return a socket to the pool. Broken sockets, for instance REQ
+        sockets waiting for a reply that will never be received, are
+        closed and make room for a new one."""
+        with self._condition:
+            if broken or self._closed:
+                socket.close(0)
+                self._size -= 1
+            else:
+                self._idle.append(socket)
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def socket(self, wait=None):
+        """Check out a socket for the duration of a with block. If the
+        block raises, the socket is considered broken."""
+        socket = self.checkout(wait)
+        try:
+            yield socket
+        except:
+            self.checkin(socket, broken=True)
+            raise
+        else:
+            self.checkin(socket)
+
+    def request(self, message, timeout=None, decode=False):
+        """Send message on a pooled socket and return the reply. Raises
+        RequestTimeout if no reply arrives within timeout milliseconds,
+        counting the time spent waiting for a socket."""
+        deadline = None if timeout is None else time.time() + timeout / 1000.0
+        with self.socket(timeout) as socket:
+            socket.send(message)
+            if deadline is not None:
+                remaining = int(max(deadline - time.time(), 0) * 1000)
+                if not socket.zmqsock.poll(remaining):
+                    raise RequestTimeout(
+                        "No reply from {0} within {1}ms".format(self.address,
+                                                                timeout))
+            return socket.recv(decode=decode)
+
+    def close(self):
+        """Close the idle sockets, sockets that are checked out are closed
+        when they are returned."""
+        with self._condition:
+            self._closed = True
+            for socket in self._idle:
+                socket.close(0)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._condition.notify_all()
+
+    def __repr__(self):
+        return "<SocketPool({0}, {1}/{2} idle)>".format(
+            self.address, self.idle, self.size)
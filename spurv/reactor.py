@@ -0,0 +1,149 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Serving many handlers from a single thread.
+
+Instead of spawning a thread or greenlet per handler, a Reactor opens
+the sockets of all its handlers, registers them in one zmq.Poller and
+serves whichever are readable from a single loop.
+"""
+import math
+import threading
+import zmq
+
+from .metrics import clock
+
+class Reactor(object):
+    """Serves a number of handlers using one zmq.Poller.
+
+    Scheduling is round-robin: every time the poller wakes up, each
+    readable socket gets to serve at most `burst` messages before the
+    poller is consulted again, so one busy socket can not starve the
+    others. `timeout` is the poll timeout in milliseconds, and bounds
+    how long it takes for stop() to have an effect. Sockets with messages
+    left over from a packed message (see spurv.buffer) are served as if
+    they were readable.
+
+    Handlers with concurrency > 1 forward to their workers with
+    zmq.proxy, which can not share the poller. They get a daemon thread
+    each, which runs until the context is terminated.
+
+    The time spent waiting in poll and serving messages is added up in
+    idle_time and busy_time.
+
+    Buffered sockets added with add_buffer are flushed when the oldest
+    message in them has waited their max_delay, so the tail of a burst
+    sent by handlers of this reactor does not wait for the next send.
+
+    A handler that raises while serving a message is counted in errors,
+    and the reactor goes on serving it and the others. Rep handlers send
+    an empty reply for the failed request, since a REP socket can not
+    receive the next request until it has replied.
+    """
+
+    def __init__(self, handlers, burst=1, timeout=100):
+        self.handlers = list(handlers)
+        self.burst = burst
+        self.timeout = timeout
+        self.idle_time = 0.0
+        self.busy_time = 0.0
+        self.served = 0
+        self.errors = 0
+        self.buffers = []
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def run(self):
+        """Open all sockets and serve handlers until stop() is called.
+        The sockets are closed when this returns."""
+        poller = zmq.Poller()
+        registered = {}
+        try:
+            for handler in self.handlers:
+                if handler.concurrency > 1:
+                    self._start_pooled(handler)
+                    continue
+                socket = handler.socket()
+                registered[socket.zmqsock] = (handler, socket)
+                poller.register(socket.zmqsock, zmq.POLLIN)
+            self._running = True
+            backlog = []
+            while self._running:
+                started = clock()
+                events = poller.poll(0 if backlog else self._poll_timeout())
+                polled = clock()
+                ready = [registered[zmqsock] for zmqsock, _ in events]
+                ready.extend(item for item in backlog if item not in ready)
+                backlog = []
+                for handler, socket in ready:
+                    self.served += self._serve(handler, socket)
+                    if socket.pending:
+                        backlog.append((handler, socket))
+                for buffered in self.buffers:
+                    buffered.flush_due()
+                self.idle_time += polled - started
+                self.busy_time += clock() - polled
+        finally:
+            self._running = False
+            for _, socket in registered.values():
+                socket.close()
+
+    def add_buffer(self, buffered):
+        """Flush buffered, a buffer.BufferedSocket only sent on by the
+        handlers of this reactor, when its max_delay has passed."""
+        self.buffers.append(buffered)
+
+    def _poll_timeout(self):
+        deadlines = [buffered.deadline for buffered in self.buffers
+                     if buffered.deadline is not None]
+        if not deadlines:
+            return self.timeout
+        due = int(math.ceil((min(deadlines) - clock()) * 1000))
+        return max(0, min(self.timeout, due))
+
+    def _start_pooled(self, handler):
+        thread = threading.Thread(target=handler.start)
+        thread.daemon = True
+        thread.start()
+
+    def _serve(self, handler, socket):
+        for served in range(self.burst):
+            try:
+                handler.serve(socket, zmq.NOBLOCK)
+            except zmq.Again:
+                return served
+            except zmq.ContextTerminated:
+                raise
+            except Exception:
+                self.errors += 1
+                self._recover(handler, socket)
+        return self.burst
+
+    def _recover(self, handler, socket):
+        if not handler.replies:
+            return
+        try:
+            socket.send_frames([b""], zmq.NOBLOCK)
+        except zmq.ZMQError:
+            pass # Failed after replying, or before receiving
+
+    @property
+    def utilization(self):
+        """The fraction of the time spent serving rather than waiting."""
+        total = self.idle_time + self.busy_time
+        return self.busy_time / total if total else 0.0
+
+    def stop(self):
+        """Make run() return after the current iteration. Safe to call
+        from other threads."""
+        self._running = False
+
+    def __repr__(self):
+        return "<Reactor({0})>".format(self.handlers)
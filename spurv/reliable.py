@@ -0,0 +1,169 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Requests that survive servers going away.
+
+A REQ socket whose server dies waits for the reply forever. A
+ReliableClient waits at most timeout milliseconds for each reply. When
+none arrives, it closes the socket, since a REQ socket that is waiting
+for a reply can not send anything else, and tries again on another
+endpoint, up to retries times (the Lazy Pirate pattern):
+
+    client = ctx.req.reliable(["tcp://a:5555", "tcp://b:5555"],
+                              timeout=500, retries=2)
+    reply = client.request(["lookup", key], decode=True)
+
+Endpoints are picked at random, weighted towards the ones with the
+lowest moving average of response time. Endpoints that have not replied
+yet are tried first, and an endpoint that times out is left alone for
+a while, longer each time it fails in a row.
+
+With heartbeat, the sockets send ZMTP heartbeats every heartbeat
+milliseconds and drop connections to peers that stop answering them, so
+a dead server is noticed even between requests.
+
+A ReliableClient made by the Dealer hub talks to the same servers over
+DEALER sockets. A ReliableClient is not thread-safe, use one per thread.
+"""
+import random
+import zmq
+
+from . import enc
+from .metrics import clock
+from .pool import RequestTimeout
+
+class Endpoint(object):
+    """The state of one endpoint of a ReliableClient."""
+
+    def __init__(self, address):
+        self.address = address
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.socket = None
+
+    def replied(self, elapsed, alpha):
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += alpha * (elapsed - self.latency)
+        self.failures = 0
+
+    def failed(self, now, backoff, max_backoff):
+        self.failures += 1
+        delay = min(backoff * 2 ** (self.failures - 1), max_backoff)
+        self.down_until = now + delay / 1000.0
+
+    def reset(self):
+        if self.socket is not None:
+            self.socket.close(0)
+            self.socket = None
+
+    def __repr__(self):
+        return "<Endpoint({0}, latency={1}, failures={2})>".format(
+            self.address, self.latency, self.failures)
+
+class ReliableClient(object):
+    """Sends requests to one of a list of endpoints, retrying on others
+    when no reply arrives in time."""
+
+    def __init__(self, hub, endpoints, timeout=2500, retries=3, alpha=0.2,
+                 backoff=100, max_backoff=5000, heartbeat=None):
+        """Arguments:
+        - `timeout`: Milliseconds to wait for each reply.
+        - `retries`: How many times to retry a request that times out.
+        - `alpha`: The weight of new samples in the moving average of
+          response times.
+        - `backoff`, `max_backoff`: Milliseconds an endpoint is left alone
+          after timing out, doubling for every failure in a row.
+        - `heartbeat`: Milliseconds between ZMTP heartbeats, if any.
+        """
+        if not endpoints:
+            raise ValueError("ReliableClient needs at least one endpoint")
+        self.hub = hub
+        self.endpoints = [Endpoint(address) for address in endpoints]
+        self.timeout = timeout
+        self.retries = retries
+        self.alpha = alpha
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.options = {"linger": 0}
+        if heartbeat is not None:
+            self.options.update(heartbeat_ivl=heartbeat,
+                                heartbeat_timeout=3 * heartbeat,
+                                heartbeat_ttl=3 * heartbeat)
+
+    def select(self, exclude=()):
+        """Pick an endpoint, preferring ones that are up, have not been
+        tried yet and respond quickly."""
+        now = clock()
+        candidates = [endpoint for endpoint in self.endpoints
+                      if endpoint not in exclude] or self.endpoints
+        up = [endpoint for endpoint in candidates
+              if endpoint.down_until <= now]
+        if not up:
+            return min(candidates, key=lambda endpoint: endpoint.down_until)
+        untried = [endpoint for endpoint in up if endpoint.latency is None]
+        if untried:
+            return random.choice(untried)
+        weights = [1.0 / max(endpoint.latency, 1e-6) for endpoint in up]
+        pick = random.random() * sum(weights)
+        for endpoint, weight in zip(up, weights):
+            pick -= weight
+            if pick <= 0:
+                return endpoint
+        return up[-1]
+
+    def _socket(self, endpoint):
+        if endpoint.socket is None:
+            endpoint.socket = self.hub.connected(endpoint.address,
+                                                 **self.options)
+        return endpoint.socket
+
+    def request(self, message, timeout=None, retries=None, decode=False):
+        """Send message and return the reply, like Socket.recv would.
+        Raises pool.RequestTimeout if no reply arrives after retries
+        attempts of timeout milliseconds each."""
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        tried = []
+        for _ in range(retries + 1):
+            endpoint = self.select(tried)
+            tried.append(endpoint)
+            socket = self._socket(endpoint)
+            recv_copy = True if socket.codec is None else socket.codec.copy
+            frames, copy = socket._encode(message, True)
+            if enc.is_bytes(frames):
+                frames = [frames]
+            dealer = socket.zmqsock.type == zmq.DEALER
+            if dealer:
+                frames = [b""] + list(frames)
+            started = clock()
+            socket.send_frames(frames, copy=copy)
+            if socket.zmqsock.poll(timeout):
+                reply = socket.recv_frames(copy=recv_copy)
+                endpoint.replied(clock() - started, self.alpha)
+                if dealer:
+                    reply = reply[1:]
+                return socket._unpack(reply, decode, recv_copy)
+            endpoint.reset()
+            endpoint.failed(clock(), self.backoff, self.max_backoff)
+        raise RequestTimeout("No reply from {0} after {1} attempts".format(
+            ", ".join(endpoint.address for endpoint in tried), retries + 1))
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<ReliableClient({0})>".format(self.endpoints)
@@ -0,0 +1,204 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Pipelined requests over a single DEALER socket.
+
+A REQ socket can only have one request in flight. A Client sends from a
+DEALER socket instead, tagging each request with a correlation id, and
+hands out a future for the reply:
+
+    client = ctx.dealer.client("tcp://localhost:5555", decode=True)
+    futures = [client.call(["lookup", key]) for key in keys]
+    replies = [future.result() for future in futures]
+
+Requests are sent as [id, "", frames...]. A REP socket treats the id as
+the envelope of the request and sends it back in front of the reply, so
+a Client works against any Rep handler, including ones with a worker
+pool. Replies may arrive in any order.
+
+The socket is owned by a background thread. Calling threads hand their
+requests to it over inproc, so call is safe to use from any thread.
+
+Requires concurrent.futures, from python 3.2 or the futures backport,
+and asyncio for call_async.
+"""
+import heapq
+import itertools
+import struct
+import threading
+import zmq
+
+try:
+    import concurrent.futures as futures
+except ImportError:
+    futures = None
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from .metrics import clock
+from .pool import RequestTimeout
+
+_clients = itertools.count()
+_correlation = struct.Struct("!Q")
+_deadline = struct.Struct("!d")
+
+class Client(object):
+    """Sends requests to address from a DEALER socket made by hub, with
+    any number of them in flight."""
+
+    def __init__(self, hub, address, decode=False, timeout=100):
+        """Arguments:
+        - `decode`: How to decode replies, like the decode of Socket.recv.
+        - `timeout`: Poll timeout of the background thread in milliseconds,
+          bounds how late request timeouts and close() take effect.
+        """
+        if futures is None:
+            raise ImportError("Client requires concurrent.futures")
+        self.hub = hub
+        self.address = address
+        self.decode = decode
+        self.timeout = timeout
+        self._inbox = "inproc://spurv-rpc-{0}".format(next(_clients))
+        self._ids = itertools.count()
+        # Futures are added by calling threads and removed by the
+        # background thread, single dict operations are atomic.
+        self._pending = {}
+        self._local = threading.local()
+        self._senders = []
+        self._senders_lock = threading.Lock()
+        self._closed = False
+        self._socket = hub.connected(address)
+        codec = self._socket.codec
+        self._copy = True if codec is None else codec.copy
+        self._inbound = hub.context.socket(zmq.PULL)
+        self._inbound.bind(self._inbox)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def in_flight(self):
+        """The number of requests that are waiting for a reply."""
+        return len(self._pending)
+
+    def call(self, message, timeout=None):
+        """Send message and return a concurrent.futures.Future for the reply.
+        If timeout milliseconds pass without a reply, the future fails with
+        pool.RequestTimeout."""
+        if self._closed:
+            raise ValueError("Client is closed")
+        future = futures.Future()
+        correlation = _correlation.pack(next(self._ids))
+        if timeout is None:
+            deadline = b""
+        else:
+            deadline = _deadline.pack(clock() + timeout / 1000.0)
+        frames, copy = self._socket._encode(message, True)
+        if not isinstance(frames, list):
+            frames = [frames]
+        self._pending[correlation] = future
+        self._sender().send_multipart([deadline, correlation, b""] + frames,
+                                      copy=copy)
+        return future
+
+    def call_async(self, message, timeout=None):
+        """Like call, but returns an asyncio future for the reply."""
+        if asyncio is None:
+            raise ImportError("call_async requires asyncio")
+        return asyncio.wrap_future(self.call(message, timeout))
+
+    def _sender(self):
+        try:
+            return self._local.sender
+        except AttributeError:
+            sender = self.hub.context.socket(zmq.PUSH)
+            sender.connect(self._inbox)
+            self._local.sender = sender
+            with self._senders_lock:
+                self._senders.append(sender)
+            return sender
+
+    def _run(self):
+        poller = zmq.Poller()
+        poller.register(self._socket.zmqsock, zmq.POLLIN)
+        poller.register(self._inbound, zmq.POLLIN)
+        deadlines = []
+        try:
+            while not self._closed:
+                events = dict(poller.poll(self.timeout))
+                if self._inbound in events:
+                    self._forward(deadlines)
+                if self._socket.zmqsock in events:
+                    self._receive()
+                self._expire(deadlines)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            self._inbound.close(0)
+            self._socket.close(0)
+            self._fail_pending(ValueError("Client is closed"))
+
+    def _forward(self, deadlines):
+        try:
+            while True:
+                frames = self._inbound.recv_multipart(zmq.NOBLOCK, copy=False)
+                deadline = frames[0].bytes
+                if deadline:
+                    heapq.heappush(deadlines, (_deadline.unpack(deadline)[0],
+                                               frames[1].bytes))
+                self._socket.send_frames(frames[1:], copy=False)
+        except zmq.Again:
+            pass
+
+    def _receive(self):
+        try:
+            while True:
+                frames = self._socket.recv_frames(zmq.NOBLOCK, self._copy)
+                correlation = frames[0] if self._copy else frames[0].bytes
+                future = self._pending.pop(correlation, None)
+                if future is not None and future.set_running_or_notify_cancel():
+                    future.set_result(self._socket._unpack(
+                        frames[2:], self.decode, self._copy))
+        except zmq.Again:
+            pass
+
+    def _expire(self, deadlines):
+        now = clock()
+        while deadlines and deadlines[0][0] <= now:
+            _, correlation = heapq.heappop(deadlines)
+            future = self._pending.pop(correlation, None)
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(RequestTimeout(
+                    "No reply from {0} in time".format(self.address)))
+
+    def _fail_pending(self, error):
+        while self._pending:
+            _, future = self._pending.popitem()
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def close(self):
+        """Stop the background thread, failing requests still in flight."""
+        self._closed = True
+        self._thread.join()
+        with self._senders_lock:
+            for sender in self._senders:
+                sender.close(0)
+            self._senders = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<Client({0}, {1} in flight)>".format(self.address,
+                                                     self.in_flight)
@@ -0,0 +1,240 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Runners that decide where the handlers of a Spurv run.
+
+A ProcessRunner forks a number of worker processes and spreads the
+handlers over them, so handlers that are heavy on the CPU do not
+compete for one GIL:
+
+    ctx = Spurv()
+
+    @ctx.pull.listen("tcp://ventilator:5557", bind=False)
+    def work(message):
+        ...
+
+    ProcessRunner(ctx, processes=32, replicas={work: 32}).run()
+
+Each worker gets a fresh context and opens the sockets of its handlers
+itself, then serves them all with a Reactor. Handlers that connect can
+be replicated over several processes; a handler that binds can only run
+in one, since only one socket can bind an address. inproc addresses do
+not reach across processes.
+
+Workers are supervised: a worker that dies is started again, with the
+same handlers, after restart_delay seconds.
+
+A ThreadRunner spreads the handlers over a fixed number of threads in
+one process instead, each serving its share with a Reactor:
+
+    runner = ThreadRunner(ctx, threads=4)
+    runner.start()
+    ...
+    runner.stats()
+
+pyzmq releases the GIL while it waits in poll, send and recv, so threads
+overlap their waiting. Only one of them runs python code at a time,
+though, so more threads than cores does not buy more handler time; the
+number of threads defaults to the smaller of the number of handlers and
+the number of CPUs. Before starting, the runner sizes the io_threads of
+the context after the number of tcp endpoints of the handlers, see
+io_threads_for. stats() tells how busy each thread has been, which is
+what to look at when deciding on the number of threads.
+"""
+import multiprocessing
+import threading
+import time
+import zmq
+
+from . import reactor
+
+TCP_ENDPOINTS_PER_IO_THREAD = 8
+
+def io_threads_for(endpoints, cpus=None):
+    """A number of io threads for a context with this many tcp endpoints:
+    one per TCP_ENDPOINTS_PER_IO_THREAD started, at most one per CPU."""
+    cpus = cpus or multiprocessing.cpu_count()
+    wanted = 1 + (endpoints - 1) // TCP_ENDPOINTS_PER_IO_THREAD
+    return max(1, min(wanted, cpus))
+
+def _serve(spurv, runners):
+    spurv.renew_context()
+    reactor.Reactor(runners).run()
+
+class ProcessRunner(object):
+    """Runs the handlers of a Spurv in forked worker processes."""
+
+    def __init__(self, spurv, processes=None, replicas=None,
+                 restart_delay=1.0):
+        """Arguments:
+        - `processes`: The number of workers, defaults to the number of CPUs.
+        - `replicas`: A dict from handler function (or its name) to the
+          number of copies of it to run, each in a different process if
+          there are enough of them.
+        """
+        self.spurv = spurv
+        self.processes = processes or multiprocessing.cpu_count()
+        self.replicas = replicas or {}
+        self.restart_delay = restart_delay
+        self.restarts = 0
+        self._workers = []
+        self._running = False
+        self._fork = multiprocessing.get_context("fork")
+
+    def _replicas(self, runner):
+        handlers = getattr(runner, "handlers", [runner])
+        count = 1
+        for handler in handlers:
+            for key, wanted in self.replicas.items():
+                if key is handler.fn or key == handler.fn.__name__:
+                    count = max(count, wanted)
+        if count > 1 and runner.bind:
+            raise ValueError("Can not replicate {0}, it binds {1}".format(
+                runner, runner.addr))
+        return count
+
+    def assignments(self):
+        """The runners each worker process serves, as a list of lists.
+        Replicas are spread round-robin, so copies of a handler end up in
+        different processes."""
+        assigned = [[] for _ in range(self.processes)]
+        slot = 0
+        for runner in self.spurv.runners():
+            for _ in range(self._replicas(runner)):
+                assigned[slot % self.processes].append(runner)
+                slot += 1
+        return [runners for runners in assigned if runners]
+
+    def _spawn(self, runners):
+        worker = self._fork.Process(target=_serve, args=(self.spurv, runners))
+        worker.daemon = True
+        worker.start()
+        return worker
+
+    def start(self):
+        """Fork the workers without waiting for them."""
+        self._workers = [(runners, self._spawn(runners))
+                         for runners in self.assignments()]
+        self._running = True
+
+    def supervise(self, interval=0.5):
+        """Restart workers that have died until stop() is called."""
+        while self._running:
+            for index, (runners, worker) in enumerate(self._workers):
+                if not worker.is_alive() and self._running:
+                    worker.join()
+                    time.sleep(self.restart_delay)
+                    self._workers[index] = (runners, self._spawn(runners))
+                    self.restarts += 1
+            time.sleep(interval)
+
+    def run(self):
+        """Start the workers and supervise them until stop() is called,
+        then terminate them."""
+        self.start()
+        try:
+            self.supervise()
+        finally:
+            self.terminate()
+
+    def stop(self):
+        """Make supervise return. Safe to call from other threads."""
+        self._running = False
+
+    def terminate(self):
+        self._running = False
+        for _, worker in self._workers:
+            worker.terminate()
+        for _, worker in self._workers:
+            worker.join()
+
+    @property
+    def pids(self):
+        return [worker.pid for _, worker in self._workers]
+
+    def __repr__(self):
+        return "<ProcessRunner({0} processes)>".format(self.processes)
+
+class ThreadRunner(object):
+    """Runs the handlers of a Spurv on a bounded number of threads, all
+    sharing its context."""
+
+    def __init__(self, spurv, threads=None, io_threads=None, burst=1,
+                 timeout=100):
+        """Arguments:
+        - `threads`: The number of threads, defaults to the smaller of
+          the number of handlers and the number of CPUs.
+        - `io_threads`: The io_threads of the context, defaults to
+          io_threads_for the number of tcp endpoints. It only has an
+          effect if the context has not created any sockets yet.
+        - `burst`, `timeout`: Passed on to each Reactor.
+        """
+        runners = list(spurv.runners())
+        self.spurv = spurv
+        self.threads = threads or max(1, min(len(runners),
+                                             multiprocessing.cpu_count()))
+        self.io_threads = io_threads
+        groups = [runners[index::self.threads] for index in range(self.threads)]
+        self.reactors = [reactor.Reactor(group, burst, timeout)
+                         for group in groups if group]
+        self._threads = []
+
+    @property
+    def tcp_endpoints(self):
+        return sum(1 for runner in self.spurv.runners()
+                   if runner.addr.startswith("tcp://"))
+
+    def start(self):
+        """Size io_threads and start the threads, without waiting."""
+        io_threads = self.io_threads
+        if io_threads is None:
+            io_threads = io_threads_for(self.tcp_endpoints)
+        self.spurv.context.set(zmq.IO_THREADS, io_threads)
+        self.spurv.io_threads = io_threads
+        self._threads = [threading.Thread(target=self._run, args=(reactor_,),
+                                          name="spurv-{0}".format(index))
+                         for index, reactor_ in enumerate(self.reactors)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _run(self, reactor_):
+        try:
+            reactor_.run()
+        except zmq.ContextTerminated:
+            pass
+
+    def run(self):
+        """Start the threads and wait for them to stop."""
+        self.start()
+        self.join()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stop(self, timeout=None):
+        """Make every thread return, closing its sockets."""
+        for reactor_ in self.reactors:
+            reactor_.stop()
+        self.join(timeout)
+
+    def stats(self):
+        """Idle and busy time in seconds, and messages served and failed,
+        per thread."""
+        return [{"thread": index,
+                 "handlers": [getattr(runner, "name", repr(runner))
+                              for runner in reactor_.handlers],
+                 "idle": reactor_.idle_time,
+                 "busy": reactor_.busy_time,
+                 "served": reactor_.served,
+                 "errors": reactor_.errors,
+                 "utilization": reactor_.utilization}
+                for index, reactor_ in enumerate(self.reactors)]
+
+    def __repr__(self):
+        return "<ThreadRunner({0} threads)>".format(self.threads)
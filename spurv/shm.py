@@ -0,0 +1,179 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Passing large frames between local processes through shared memory.
+
+Sending a frame of many megabytes over ipc copies it into the socket and
+out again on the other side. A socket with a SharedMemory policy, that
+is only connected or bound to inproc and ipc addresses, instead copies
+frames above a threshold into a multiprocessing.shared_memory segment
+and sends the name of the segment. The receiver maps the segment and
+gets a memoryview on it, without copying:
+
+    ctx = Spurv(shared_memory=SharedMemory(threshold=1024 * 1024))
+
+Which frames were replaced by segment names is told in a flag frame at
+the end of the message, see spurv.trailer. Only sockets with a
+SharedMemory policy that are not connected or bound to other transports
+look for the flag frame, and only segments named by spurv are mapped, so
+a peer can not make a receiver map or unlink other segments.
+
+Cleaning up: on socket types where each message has one receiver, the
+receiver unlinks the segment as soon as it has mapped it, and its memory
+is freed when the last view on it is gone. On PUB and XPUB sockets any
+number of subscribers may map a segment, so the sender unlinks it once
+it is lease seconds old, and subscribers must receive the message within
+that time. A message that is never received on a socket of the first
+kind, or a sender that dies before its leases run out, leaves segments
+behind.
+
+Requires python 3.8 or newer.
+"""
+import collections
+import itertools
+import os
+import struct
+import zmq
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    shared_memory = resource_tracker = None
+
+from . import trailer
+from .metrics import clock
+
+SHARED = b"\x00spurv-shared\x00"
+
+PREFIX = "spurv-"
+
+FAN_OUT = (zmq.PUB, zmq.XPUB)
+
+_handle = struct.Struct("!Q")
+_names = itertools.count()
+
+# Mapped segments that still have views on them, closed once they don't.
+_attached = []
+
+def _untrack(segment):
+    # We decide when segments are unlinked, not the resource tracker.
+    # Processes may share a tracker, so every segment is untracked
+    # right after it is created or mapped.
+    resource_tracker.unregister(segment._name, "shared_memory")
+
+def _unlink(segment):
+    # unlink() untracks the segment, so the tracker must know it.
+    resource_tracker.register(segment._name, "shared_memory")
+    segment.unlink()
+
+def is_shared(frames):
+    """Whether a received message ends with a flag frame."""
+    return trailer.is_flagged(frames, SHARED)
+
+def sweep():
+    """Close mapped segments that nothing has a view on any more."""
+    for segment in list(_attached):
+        try:
+            segment.close()
+        except BufferError:
+            continue
+        _attached.remove(segment)
+
+def attach(handle, unlink):
+    """A memoryview on the segment a handle frame names. If unlink, the
+    segment is unlinked, so it is freed once the view is gone."""
+    sweep()
+    size, = _handle.unpack_from(handle)
+    name = bytes(handle[_handle.size:]).decode("ascii")
+    if not name.startswith(PREFIX):
+        raise ValueError("Not a spurv segment: {0}".format(name))
+    segment = shared_memory.SharedMemory(name)
+    _untrack(segment)
+    if unlink:
+        _unlink(segment)
+    _attached.append(segment)
+    return segment.buf[:size]
+
+def receive(frames, unlink, copy=True):
+    """The frames of a received message with a flag frame, with handle
+    frames replaced by views on their segments. Frames received without
+    copying are handed back as zmq.Frame objects."""
+    _, flags = trailer.read(frames, SHARED)
+    result = []
+    for frame, flag in zip(frames, flags):
+        if flag:
+            view = attach(getattr(frame, "bytes", frame), unlink)
+            frame = view if copy else zmq.Frame(view, copy=False)
+        result.append(frame)
+    return result
+
+class SharedMemory(object):
+    """Decides which frames a socket sends through shared memory, and
+    keeps track of the segments it has to unlink."""
+
+    def __init__(self, threshold=1024 * 1024, lease=10.0):
+        """Arguments:
+        - `threshold`: Frames of at least this many bytes are sent
+          through shared memory.
+        - `lease`: How many seconds segments sent on PUB and XPUB sockets
+          are kept before they are unlinked.
+        """
+        if shared_memory is None:
+            raise ImportError("Shared memory requires python 3.8 or newer")
+        self.threshold = threshold
+        self.lease = lease
+        self._leased = collections.deque()
+
+    def _create(self, frame):
+        size = len(frame)
+        name = "{0}{1}-{2}".format(PREFIX, os.getpid(), next(_names))
+        segment = shared_memory.SharedMemory(name, create=True,
+                                             size=max(size, 1))
+        _untrack(segment)
+        segment.buf[:size] = frame
+        return segment, _handle.pack(size) + name.encode("ascii")
+
+    def share(self, frames, fan_out=False, envelope=0):
+        """The frames of a message, with large frames copied into shared
+        memory and replaced by handles, and a flag frame added if any
+        were. The first envelope frames are left alone."""
+        self.expire()
+        flags = []
+        result = list(frames[:envelope])
+        for frame in frames[envelope:]:
+            if len(frame) < self.threshold:
+                flags.append(False)
+                result.append(frame)
+                continue
+            segment, handle = self._create(frame)
+            if fan_out:
+                self._leased.append((clock() + self.lease, segment))
+            else:
+                # The receiver unlinks it.
+                segment.close()
+            flags.append(True)
+            result.append(handle)
+        if not any(flags):
+            return frames
+        result.append(trailer.flag_frame(SHARED, flags))
+        return result
+
+    def expire(self, now=None):
+        """Unlink segments whose lease has run out."""
+        now = clock() if now is None else now
+        while self._leased and self._leased[0][0] <= now:
+            _, segment = self._leased.popleft()
+            segment.close()
+            _unlink(segment)
+
+    def close(self):
+        """Unlink every leased segment."""
+        self.expire(float("inf"))
+
+    def __repr__(self):
+        return "<SharedMemory({0} bytes, {1} leased)>".format(
+            self.threshold, len(self._leased))
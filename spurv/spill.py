@@ -0,0 +1,257 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Spilling messages to disk when a PUSH socket can not take them.
+
+A PUSH socket blocks in send when every peer has reached its high-water
+mark, or when there are no peers at all. A SpillingSocket never blocks:
+a message the socket can not take right away is appended to a segment
+file on disk instead, and spilled messages are sent, in order, as soon
+as the socket can take them again:
+
+    push = ctx.push.spilling("tcp://collector:5557", "/var/spool/ingest")
+    push.send(["event", data])
+    ...
+    push.replay()  # when idle, to send what has been spilled
+
+Segment files are memory-mapped and written append-only. Each record is
+a 4 byte length followed by the frames of a message, as buffer.pack lays
+them out. A segment whose messages have all been handed to zmq is
+deleted, or reused if it is the only one. Where sending has got to is
+kept in a cursor file, so a SpillingSocket opened on the same directory
+picks up where the last one left off. Messages that were handed to zmq
+after the cursor was last saved may be sent again, so delivery is at
+least once.
+"""
+import mmap
+import os
+import struct
+import zmq
+
+from . import buffer, enc
+
+_length = struct.Struct("!I")
+_cursor = struct.Struct("!QQ")
+
+def _segment_name(index):
+    return "{0:020d}.seg".format(index)
+
+class Segment(object):
+    """One memory-mapped, append-only segment file."""
+
+    def __init__(self, path, index, size):
+        self.path = path
+        self.index = index
+        self._file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        if os.path.getsize(path) < size:
+            self._file.truncate(size)
+        self.size = os.path.getsize(path)
+        self._map = mmap.mmap(self._file.fileno(), self.size)
+        self.end = 0
+        self.count = sum(1 for _ in self.records(0))
+
+    def records(self, offset):
+        """Iterate over (offset after, frames) of the records from
+        offset. Scanning to the end finds the end of the segment."""
+        while offset + _length.size <= self.size:
+            length, = _length.unpack_from(self._map, offset)
+            if not length:
+                break
+            start = offset + _length.size
+            offset = start + length
+            yield offset, buffer.unpack(self._map[start:offset])[0]
+        self.end = max(self.end, offset)
+
+    def fits(self, length):
+        return self.end + _length.size + length <= self.size
+
+    def append(self, payload):
+        offset = self.end
+        _length.pack_into(self._map, offset, len(payload))
+        start = offset + _length.size
+        self._map[start:start + len(payload)] = payload
+        self.end = start + len(payload)
+        # Zero the next length, so a reused segment ends where it should.
+        if self.end + _length.size <= self.size:
+            _length.pack_into(self._map, self.end, 0)
+        self.count += 1
+
+    def reset(self):
+        _length.pack_into(self._map, 0, 0)
+        self.end = 0
+        self.count = 0
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+
+class SpillQueue(object):
+    """A queue of messages kept in segment files in a directory."""
+
+    def __init__(self, directory, segment_size=64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        indices = sorted(int(name[:-4]) for name in os.listdir(directory)
+                         if name.endswith(".seg"))
+        self._segments = [self._open(index) for index in indices]
+        if not self._segments:
+            self._segments.append(self._open(0))
+        self._cursor_file = self._open_cursor()
+        index, offset = _cursor.unpack_from(self._cursor_map, 0)
+        while len(self._segments) > 1 and self._segments[0].index < index:
+            self._segments.pop(0).remove()
+        if self._segments[0].index != index:
+            offset = 0
+        self._offset = offset
+        consumed = sum(1 for end, _ in self._segments[0].records(0)
+                       if end <= offset)
+        self.count = sum(segment.count for segment in self._segments)
+        self.count -= consumed
+
+    def _open(self, index, size=None):
+        path = os.path.join(self.directory, _segment_name(index))
+        return Segment(path, index, size or self.segment_size)
+
+    def _open_cursor(self):
+        path = os.path.join(self.directory, "cursor")
+        exists = os.path.exists(path)
+        cursor_file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            cursor_file.write(b"\0" * _cursor.size)
+            cursor_file.flush()
+        self._cursor_map = mmap.mmap(cursor_file.fileno(), _cursor.size)
+        return cursor_file
+
+    def __len__(self):
+        return self.count
+
+    def append(self, frames):
+        """Append a message, a list of bytes, to the end of the queue."""
+        payload = buffer.pack([frames])
+        tail = self._segments[-1]
+        if not tail.fits(len(payload)):
+            size = max(self.segment_size, len(payload) + 2 * _length.size)
+            tail = self._open(tail.index + 1, size)
+            self._segments.append(tail)
+        tail.append(payload)
+        self.count += 1
+
+    def peek(self):
+        """The (offset after, frames) of the first message, or None."""
+        while True:
+            for record in self._segments[0].records(self._offset):
+                return record
+            if len(self._segments) == 1:
+                return None
+            self._segments.pop(0).remove()
+            self._offset = 0
+
+    def pop(self, offset):
+        """Remove the first message, given the offset peek returned."""
+        self._offset = offset
+        self.count -= 1
+        head = self._segments[0]
+        if offset >= head.end:
+            if len(self._segments) > 1:
+                self._segments.pop(0).remove()
+                self._offset = 0
+            elif offset:
+                head.reset()
+                self._offset = 0
+
+    def save(self):
+        """Remember how far the queue has been consumed."""
+        _cursor.pack_into(self._cursor_map, 0, self._segments[0].index,
+                          self._offset)
+
+    def flush(self):
+        """Flush segments and the cursor to disk."""
+        self.save()
+        self._cursor_map.flush()
+        for segment in self._segments:
+            segment.flush()
+
+    def close(self):
+        self.flush()
+        self._cursor_map.close()
+        self._cursor_file.close()
+        for segment in self._segments:
+            segment.close()
+
+class SpillingSocket(object):
+    """Wraps a socket, spilling the messages it can not send right away
+    to a SpillQueue."""
+
+    def __init__(self, socket, directory, segment_size=64 * 1024 * 1024):
+        self.socket = socket
+        self.queue = SpillQueue(directory, segment_size)
+
+    @property
+    def zmqsock(self):
+        return self.socket.zmqsock
+
+    @property
+    def spilled(self):
+        """The number of messages waiting on disk."""
+        return len(self.queue)
+
+    def send(self, content):
+        """Send content, encoded like Socket.send would, without blocking.
+        Returns False if it had to be spilled."""
+        frames, _ = self.socket._encode(content, True)
+        if enc.is_bytes(frames):
+            frames = [frames]
+        if self.queue.count and not self.replay():
+            self.queue.append([bytes(frame) for frame in frames])
+            return False
+        try:
+            self.socket.send_frames(frames, zmq.NOBLOCK)
+            return True
+        except zmq.Again:
+            self.queue.append([bytes(frame) for frame in frames])
+            return False
+
+    def replay(self, max_messages=None):
+        """Send spilled messages, oldest first, until the socket can not
+        take any more, or max_messages have been sent. Returns True if
+        nothing is left on disk."""
+        sent = 0
+        try:
+            while self.queue.count and (max_messages is None or
+                                        sent < max_messages):
+                offset, frames = self.queue.peek()
+                self.socket.send_frames(frames, zmq.NOBLOCK)
+                self.queue.pop(offset)
+                sent += 1
+        except zmq.Again:
+            pass
+        if sent:
+            self.queue.save()
+        return not self.queue.count
+
+    def close(self, linger=None):
+        self.queue.close()
+        self.socket.close(linger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<SpillingSocket({0}, {1} spilled)>".format(self.socket,
+                                                           self.spilled)
@@ -0,0 +1,137 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import threading
+import time
+import zmq
+from nose.tools import raises
+from .. import Spurv
+from ..admission import Admission, TokenBucket
+from ..codec import Pickle
+from ..enc import u
+
+def test_token_bucket_allows_bursts_then_rate():
+    bucket = TokenBucket(100, burst=2)
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    time.sleep(0.02)
+    assert bucket.take()
+
+def test_rep_rejects_over_rate():
+    spurv = Spurv()
+    admission = Admission(rate=0.001, burst=2, reject=["busy"])
+    calls = []
+
+    @spurv.rep.listen("inproc://admission", admission=admission)
+    def echo(message):
+        calls.append(message)
+        return message
+
+    def serve():
+        try:
+            next(spurv.handlers()).start()
+        except zmq.ContextTerminated:
+            pass
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    with spurv.req.connected("inproc://admission") as req:
+        replies = []
+        for _ in range(4):
+            req.send("hello")
+            replies.append(req.recv(decode=True))
+    assert replies == [[u("hello")]] * 2 + [[u("busy")]] * 2
+    assert len(calls) == 2
+    assert admission.stats() == {"admitted": 2, "shed": 2}
+    spurv.context.term()
+
+def test_pull_sheds_backlog_and_samples():
+    spurv = Spurv()
+    admission = Admission(max_queue=2, sample=3)
+    calls = []
+
+    @spurv.pull.listen("inproc://shed", admission=admission)
+    def work(message):
+        calls.append(message)
+
+    handler = next(spurv.handlers())
+    pull = handler.socket()
+    with spurv.push.connected("inproc://shed") as push:
+        for index in range(10):
+            push.send(str(index))
+        time.sleep(0.1)
+        for _ in range(10):
+            handler.serve(pull)
+    # Messages 0 and 1 are admitted while the backlog is short, the rest
+    # are shed except every third of them.
+    assert calls == [[u(str(index))] for index in (0, 1, 4, 7)]
+    assert admission.stats() == {"admitted": 4, "shed": 6}
+    pull.close()
+    spurv.context.term()
+
+def test_rep_sheds_backlog():
+    spurv = Spurv()
+    admission = Admission(max_queue=2, reject=["busy"])
+
+    @spurv.rep.listen("inproc://rep-backlog", admission=admission)
+    def echo(message):
+        return message
+
+    handler = next(spurv.handlers())
+    rep = handler.socket()
+    with spurv.dealer.connected("inproc://rep-backlog") as dealer:
+        for index in range(5):
+            dealer.send([b"", str(index)])
+        time.sleep(0.1)
+        for _ in range(5):
+            handler.serve(rep)
+        replies = [dealer.recv(decode=True)[1] for _ in range(5)]
+        assert replies == [u("0"), u("1"), u("busy"), u("busy"), u("busy")]
+        # Once the handler finds nothing waiting, it catches up.
+        raises(zmq.Again)(handler.serve)(rep, zmq.NOBLOCK)
+        dealer.send([b"", "5"])
+        handler.serve(rep)
+        assert dealer.recv(decode=True)[1] == u("5")
+    assert admission.stats() == {"admitted": 3, "shed": 3}
+    rep.close()
+    spurv.context.term()
+
+def test_reject_goes_through_the_codec():
+    spurv = Spurv()
+    admission = Admission(rate=0.001, burst=1, reject={"error": "busy"})
+
+    @spurv.rep.listen("inproc://rep-codec", codec=Pickle(),
+                      admission=admission)
+    def echo(message):
+        return message
+
+    handler = next(spurv.handlers())
+    rep = handler.socket()
+    with spurv.req.connected("inproc://rep-codec") as req:
+        req.codec = Pickle()
+        for expected in ({"id": 1}, {"error": "busy"}):
+            req.send({"id": 1})
+            handler.serve(rep)
+            assert req.recv() == expected
+    rep.close()
+    spurv.context.term()
+
+@raises(ValueError)
+def test_can_not_be_combined_with_batch():
+    with Spurv() as spurv:
+        @spurv.pull.listen("inproc://batched", batch=True,
+                           admission=Admission(rate=10))
+        def work(messages):
+            pass
+
+@raises(ValueError)
+def test_can_not_be_combined_with_conflate():
+    with Spurv() as spurv:
+        @spurv.sub.listen("inproc://conflated", conflate=True,
+                          admission=Admission(rate=10))
+        def watch(message):
+            pass
@@ -0,0 +1,182 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import asyncio
+import threading
+from nose.tools import raises
+from .. import Spurv, aio
+from ..cache import LRU
+from ..compress import Compression
+from ..metrics import Metrics
+from ..enc import u
+from ..trace import Tracer
+
+TEXT = b"the quick brown fox jumps over the lazy dog " * 100
+
+def test_aio_spurv_uses_aio_hubs():
+    with aio.Spurv() as ctx:
+        assert isinstance(ctx.rep, aio.Rep)
+        assert isinstance(ctx.req.socket(), aio.Socket)
+
+def test_coroutine_rep_handler():
+    with aio.Spurv() as ctx:
+        addr = "inproc://aio-rep"
+
+        @ctx.rep.listen(addr)
+        async def ack(message):
+            await asyncio.sleep(0)
+            return [u("Ack")] + message
+
+        async def run():
+            tasks = ctx.start()
+            with ctx.req.connected(addr) as req:
+                await req.send(u("hello"))
+                reply = await req.recv(decode=True)
+            for task in tasks:
+                task.cancel()
+            return reply
+
+        assert [u("Ack"), u("hello")] == asyncio.run(run())
+
+def test_sub_handlers_share_one_loop():
+    with aio.Spurv() as ctx:
+        addr = "inproc://aio-pub"
+        got = []
+
+        @ctx.sub.listen(addr, subs="one")
+        async def first(message):
+            got.append(message)
+
+        @ctx.sub.listen(addr, subs="two")
+        def second(message):
+            got.append(message)
+
+        async def run():
+            with ctx.pub.bound(addr) as pub:
+                tasks = ctx.start()
+                await asyncio.sleep(0.05)
+                await pub.send(["one", "1"])
+                await pub.send(["two", "2"])
+                for _ in range(100):
+                    if len(got) == 2:
+                        break
+                    await asyncio.sleep(0.01)
+                for task in tasks:
+                    task.cancel()
+
+        asyncio.run(run())
+        assert sorted(got) == [[u("one"), u("1")], [u("two"), u("2")]]
+
+def test_coroutine_pull_handler():
+    with aio.Spurv() as ctx:
+        addr = "inproc://aio-pull"
+        got = []
+
+        @ctx.pull.listen(addr)
+        async def work(message):
+            await asyncio.sleep(0)
+            got.append(message)
+
+        async def run():
+            tasks = ctx.start()
+            with ctx.push.connected(addr) as push:
+                for i in range(3):
+                    await push.send(str(i))
+                for _ in range(100):
+                    if len(got) == 3:
+                        break
+                    await asyncio.sleep(0.01)
+            for task in tasks:
+                task.cancel()
+
+        asyncio.run(run())
+        assert [[u(str(i))] for i in range(3)] == got
+
+def test_handlers_record_metrics_and_spans():
+    tracer = Tracer(sample_rate=1.0)
+    with aio.Spurv(metrics=True, tracer=tracer) as ctx:
+        addr = "inproc://aio-measured"
+
+        @ctx.rep.listen(addr)
+        async def echo(message):
+            await asyncio.sleep(0)
+            return message
+
+        async def run():
+            tasks = ctx.start()
+            with ctx.req.connected(addr) as req:
+                for i in range(2):
+                    await req.send(str(i))
+                    await req.recv()
+            for task in tasks:
+                task.cancel()
+
+        asyncio.run(run())
+        handler = ctx.rep.handler_by_name("echo")
+        assert handler.metrics.snapshot()["handler_time"]["count"] == 2
+        assert [span["name"] for span in tracer.spans] == ["rep:echo"] * 2
+
+@raises(ValueError)
+def test_handlers_refuse_options_they_can_not_serve():
+    with aio.Spurv() as ctx:
+        @ctx.rep.listen("inproc://aio-refused", cache=LRU(10))
+        def lookup(message):
+            return message
+
+def test_talks_to_sync_sockets_with_compression():
+    compression = Compression(threshold=100)
+    with Spurv(compression=compression) as sync:
+        rep = sync.rep.socket()
+        port = rep.bind_to_random_port("tcp://127.0.0.1")
+        thread = threading.Thread(target=lambda: rep.send(rep.recv()))
+        thread.start()
+        with aio.Spurv(compression=compression) as ctx:
+            async def run():
+                addr = "tcp://127.0.0.1:{0}".format(port)
+                with ctx.req.connected(addr) as req:
+                    req.metrics = Metrics()
+                    await req.send(["text", TEXT])
+                    reply = await req.recv()
+                    return reply, req.metrics.snapshot()
+
+            reply, snapshot = asyncio.run(run())
+        thread.join()
+        rep.close()
+    assert reply == [b"text", TEXT]
+    assert snapshot["messages_in"] == snapshot["messages_out"] == 1
+    assert snapshot["bytes_out"] < len(TEXT)
+
+def test_buffered_sockets_pack_and_unpack():
+    with aio.Spurv() as ctx:
+        addr = "inproc://aio-packed"
+
+        async def run():
+            with ctx.pull.bound(addr) as pull:
+                async with ctx.push.buffered(addr, bind=False, max_count=3,
+                                             pack=True) as push:
+                    for i in range(3):
+                        await push.send(["one", str(i)])
+                    assert 0 == push.pending
+                    return [await pull.recv(decode=True) for _ in range(3)]
+
+        got = asyncio.run(run())
+    assert [[u("one"), u(str(i))] for i in range(3)] == got
+
+def test_buffered_sockets_flush_after_delay():
+    with aio.Spurv() as ctx:
+        addr = "inproc://aio-delayed"
+
+        async def run():
+            with ctx.pull.bound(addr) as pull:
+                async with ctx.push.buffered(addr, bind=False,
+                                             max_delay=10) as push:
+                    await push.send("1")
+                    assert 1 == push.pending
+                    reply = await asyncio.wait_for(pull.recv(decode=True), 1)
+                    assert 0 == push.pending
+                    return reply
+
+        assert [u("1")] == asyncio.run(run())
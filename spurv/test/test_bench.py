@@ -0,0 +1,25 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+from .. import bench
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+def test_runs_every_pattern():
+    results = list(bench.run_all(transports=["inproc"], sizes=[8],
+                                 frame_counts=[2], count=20))
+    assert len(bench.PATTERNS) * len(bench.LAYERS) == len(results)
+    for result in results:
+        assert result.rate > 0
+        assert 0 <= result.p50 <= result.p99
+
+def test_report_has_a_row_per_result():
+    out = StringIO()
+    bench.report([bench.run("reqrep", "ipc", "spurv", 8, 1, 10)], out)
+    assert 2 == len(out.getvalue().splitlines())
@@ -0,0 +1,91 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import threading
+import time
+from .. import Spurv
+from ..buffer import pack, unpack, is_packed, PACKED
+from ..enc import u
+
+def test_pack_roundtrip():
+    messages = [[b"a", b""], [b"bcd"], []]
+    assert messages == unpack(pack(messages))
+    views = unpack(memoryview(pack(messages)))
+    assert [[bytes(frame) for frame in frames] for frames in views] == messages
+
+def test_recognizes_packed_messages():
+    assert is_packed([b"topic", PACKED, b""])
+    assert not is_packed([b"topic", b"x" * len(PACKED), b""])
+    assert not is_packed([b"topic", PACKED])
+
+def test_flushes_on_count():
+    with Spurv() as spurv:
+        with spurv.pull.bound("inproc://buffered") as pull:
+            with spurv.push.buffered("inproc://buffered", bind=False,
+                                     max_count=3, max_delay=10000) as push:
+                push.send("1")
+                push.send("2")
+                assert 2 == push.pending
+                assert 0 == pull.zmqsock.poll(10)
+                push.send("3")
+                assert 0 == push.pending
+                assert [["1"], ["2"], ["3"]] == pull.recv_batch(decode=True)
+
+def test_flushes_after_delay():
+    with Spurv() as spurv:
+        with spurv.pull.bound("inproc://delayed") as pull:
+            with spurv.push.buffered("inproc://delayed", bind=False,
+                                     max_delay=1) as push:
+                push.send("1")
+                time.sleep(0.01)
+                push.send("2")
+                assert 0 == push.pending
+                assert [["1"], ["2"]] == pull.recv_batch(decode=True)
+
+def test_subscribers_unpack_packed_messages():
+    with Spurv() as spurv:
+        addr = "inproc://packed"
+        with spurv.pub.buffered(addr, max_count=4, pack=True) as pub:
+            with spurv.sub.connected_subscriber(addr, "one") as sub:
+                for i in range(3):
+                    pub.send(["one", str(i)])
+                pub.send(["two", "skipped"])
+                got = [sub.recv(decode=True) for _ in range(3)]
+                assert [[u("one"), u(str(i))] for i in range(3)] == got
+                assert 0 == sub.pending
+                for i in range(4):
+                    pub.send(["one", str(i), "extra"])
+                batch = sub.recv_batch(copy=False, decode=(0,))
+                assert 4 == len(batch)
+                assert b"3" == batch[-1].bytes(1)
+
+def test_reactor_flushes_due_buffers():
+    with Spurv() as spurv:
+        pull = spurv.pull.bound("inproc://reactor-flushed")
+        push = spurv.push.buffered("inproc://reactor-flushed", bind=False,
+                                   max_delay=20)
+
+        @spurv.pull.listen("inproc://reactor-forward")
+        def forward(message):
+            push.send(message)
+
+        reactor = spurv.reactor(timeout=100)
+        reactor.add_buffer(push)
+        thread = threading.Thread(target=reactor.run)
+        thread.start()
+        try:
+            while not reactor.running:
+                time.sleep(0.01)
+            with spurv.push.connected(spurv.url_to(forward)) as source:
+                source.send("1")
+                assert pull.zmqsock.poll(500)
+                assert [u("1")] == pull.recv(decode=True)
+                assert 0 == push.pending
+        finally:
+            reactor.stop()
+            thread.join()
+            push.close()
+            pull.close()
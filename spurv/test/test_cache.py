@@ -0,0 +1,111 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import threading
+import time
+import zmq
+from .. import Spurv
+from ..cache import LRU, request_key
+from ..enc import u
+
+def test_request_key_respects_frame_boundaries():
+    assert request_key([b"ab", b"c"]) != request_key([b"a", b"bc"])
+    assert request_key([b"ab", b"c"]) == request_key([b"ab", b"c"])
+
+def test_least_recently_used_is_evicted():
+    cache = LRU(2)
+    cache.put(b"a", b"1")
+    cache.put(b"b", b"2")
+    cache.get(b"a")
+    cache.put(b"c", b"3")
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == b"1"
+    assert cache.evictions == 1
+
+def test_evicts_by_bytes():
+    cache = LRU(100, max_bytes=10)
+    cache.put(b"a", [b"1234"])
+    cache.put(b"b", [b"1234"])
+    assert cache.bytes == 10
+    cache.put(b"c", [b"1"])
+    assert len(cache) == 2 and cache.bytes == 7
+    cache.put(b"d", b"x" * 20)
+    assert cache.get(b"d") is None
+
+def test_expired_replies_are_not_used():
+    cache = LRU(10, ttl=0.01)
+    cache.put(b"a", b"1")
+    time.sleep(0.02)
+    assert cache.get(b"a") is None
+    assert cache.bytes == 0
+
+def serve_until_terminated(handler):
+    try:
+        handler.start()
+    except zmq.ContextTerminated:
+        pass
+
+def serve_in_background(spurv):
+    for handler in spurv.handlers():
+        thread = threading.Thread(target=serve_until_terminated,
+                                  args=(handler,))
+        thread.daemon = True
+        thread.start()
+
+def test_repeated_requests_skip_the_handler():
+    spurv = Spurv()
+    cache = LRU(10)
+    calls = []
+
+    @spurv.rep.listen("inproc://cached", cache=cache,
+                      invalidate="inproc://invalidate", invalidate_topic="lookup")
+    def lookup(message):
+        calls.append(message)
+        return ["found", message[0]]
+
+    invalidate = spurv.pub.bound("inproc://invalidate")
+    serve_in_background(spurv)
+    with spurv.req.connected("inproc://cached") as req:
+        for _ in range(3):
+            req.send("key")
+            assert req.recv(decode=True) == [u("found"), u("key")]
+        assert len(calls) == 1
+        assert cache.hits == 2
+        time.sleep(0.1)
+        invalidate.send(["lookup", "key"])
+        time.sleep(0.1)
+        req.send("key")
+        assert req.recv(decode=True) == [u("found"), u("key")]
+        assert len(calls) == 2
+    invalidate.close()
+    spurv.context.term()
+
+def test_workers_follow_invalidations():
+    spurv = Spurv()
+    cache = LRU(10)
+    calls = []
+
+    @spurv.rep.listen("inproc://cached-workers", cache=cache, concurrency=2,
+                      invalidate="inproc://invalidate-workers")
+    def lookup(message):
+        calls.append(message)
+        return message
+
+    invalidate = spurv.pub.bound("inproc://invalidate-workers")
+    serve_in_background(spurv)
+    with spurv.req.connected("inproc://cached-workers") as req:
+        for _ in range(2):
+            req.send("key")
+            assert req.recv(decode=True) == [u("key")]
+        assert len(calls) == 1
+        time.sleep(0.1)
+        invalidate.send("")
+        time.sleep(0.1)
+        req.send("key")
+        assert req.recv(decode=True) == [u("key")]
+        assert len(calls) == 2
+    invalidate.close()
+    spurv.context.term()
@@ -0,0 +1,76 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import pickle
+from nose.plugins.skip import SkipTest
+from nose.tools import raises
+from zmq import Frame
+from .. import Spurv, codec
+from ..enc import u
+
+def roundtrip(some_codec, obj):
+    frames = some_codec.encode(obj)
+    if not some_codec.copy:
+        frames = [Frame(frame) for frame in frames]
+    return some_codec.decode(frames)
+
+def test_struct_roundtrip():
+    packed = codec.Struct("!IQd")
+    assert (1, 2, 0.5) == roundtrip(packed, (1, 2, 0.5))
+    assert 1 == len(packed.encode((1, 2, 0.5)))
+
+def test_pickle_roundtrip():
+    obj = {"key": [1, 2.0, u("three")]}
+    assert obj == roundtrip(codec.Pickle(), obj)
+    assert obj == roundtrip(codec.Pickle(protocol=2), obj)
+
+def test_pickle_sends_buffers_out_of_band():
+    pickler = codec.Pickle(protocol=5)
+    payload = bytearray(b"x" * 100000)
+    frames = pickler.encode(pickle.PickleBuffer(payload))
+    assert 2 == len(frames)
+    assert len(frames[0]) < 1000
+
+def test_msgpack_roundtrip():
+    if codec.msgpack is None:
+        raise SkipTest("msgpack is not installed")
+    obj = {u("key"): [1, 2.0, u("three"), b"four"]}
+    assert obj == roundtrip(codec.Msgpack(), obj)
+
+def test_schema_roundtrip():
+    schema = codec.Schema("topic:str seq:uint64 price:float64 payload:bytes")
+    frames = schema.encode((u("trade"), 17, 101.5, b"raw"))
+    assert frames == [b"trade", b"\0" * 7 + b"\x11", frames[2], b"raw"]
+    message = schema.decode(frames)
+    assert message == (u("trade"), 17, 101.5, b"raw")
+    assert message.seq == 17
+
+def test_schema_from_pairs():
+    schema = codec.Schema([("ok", "bool"), ("delta", "int16")], name="Tick")
+    assert roundtrip(schema, (True, -3)) == (True, -3)
+    assert type(schema.decode([b"\x01", b"\0\0"])).__name__ == "Tick"
+
+@raises(ValueError)
+def test_schema_rejects_unknown_types():
+    codec.Schema("seq:uint128")
+
+@raises(ValueError)
+def test_schema_rejects_wrong_frame_count():
+    codec.Schema("seq:uint8").decode([b"\x01", b"\x02"])
+
+def test_handler_codec_overrides_context_codec():
+    with Spurv(codec=codec.Pickle()) as spurv:
+        @spurv.pull.listen("inproc://codec", codec=codec.Struct("!I"))
+        def foo(message):
+            pass
+        handler = spurv.pull.handler_by_name(foo)
+        with handler.socket() as socket:
+            assert isinstance(socket.codec, codec.Struct)
+            with spurv.push.connected("inproc://codec") as push:
+                assert isinstance(push.codec, codec.Pickle)
+                push.codec = codec.Struct("!I")
+                push.send((42,))
+                assert (42,) == socket.recv()
@@ -0,0 +1,123 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import os
+import threading
+from .. import Spurv
+from ..compress import Compression, Lzma, decompress, is_compressed
+from ..enc import u
+
+TEXT = b"the quick brown fox jumps over the lazy dog " * 100
+
+def test_only_large_frames_are_compressed():
+    frames = Compression(threshold=100).compress([b"topic", TEXT])
+    assert is_compressed(frames)
+    assert frames[0] == b"topic" and len(frames[1]) < len(TEXT)
+    assert decompress(frames) == [b"topic", TEXT]
+
+def test_incompressible_frames_are_sent_as_is():
+    compression = Compression(threshold=100)
+    data = os.urandom(1000)
+    assert compression.compress([data]) == [data]
+    assert compression.compress([TEXT]) == [TEXT]
+    assert is_compressed(compression.compress([TEXT]))
+
+def test_backoff_counts_large_frames_only():
+    compression = Compression(threshold=100)
+    compression.compress([os.urandom(1000)])
+    assert compression.compress([b"small"]) == [b"small"]
+    assert compression.compress([TEXT]) == [TEXT]
+    assert is_compressed(compression.compress([TEXT]))
+
+def test_envelope_is_left_alone():
+    frames = Compression(threshold=100).compress([b"id", b"", TEXT],
+                                                 envelope=2)
+    assert frames[:2] == [b"id", b""] and len(frames[2]) < len(TEXT)
+    assert decompress(frames) == [b"id", b"", TEXT]
+    # The envelope may be stripped or grow on the way.
+    assert is_compressed(frames[2:])
+    assert decompress(frames[2:]) == [TEXT]
+    assert decompress([b"peer"] + frames) == [b"peer", b"id", b"", TEXT]
+
+def test_sockets_back_off_on_their_own():
+    spurv = Spurv(compression=Compression(threshold=100))
+    noisy, quiet = spurv.push.socket(), spurv.push.socket()
+    noisy.compression.compress([os.urandom(1000)])
+    assert is_compressed(quiet.compression.compress([TEXT]))
+    assert not is_compressed(noisy.compression.compress([TEXT]))
+    spurv.destroy()
+
+def test_first_frame_can_be_left_alone():
+    frames = Compression(Lzma(), threshold=100).compress([TEXT, TEXT],
+                                                         skip_first=True)
+    assert frames[0] == TEXT and len(frames[1]) < len(TEXT)
+    assert decompress(frames) == [TEXT, TEXT]
+
+def tcp_pair(server, client):
+    port = server.bind_to_random_port("tcp://127.0.0.1")
+    client.connect("tcp://127.0.0.1:{0}".format(port))
+    return server, client
+
+def test_compresses_over_tcp_only():
+    spurv = Spurv(compression=Compression(threshold=100))
+    pull, push = tcp_pair(spurv.pull.socket(), spurv.push.socket())
+    push.send(["text", TEXT])
+    raw = pull.zmqsock.recv_multipart()
+    assert is_compressed(raw)
+    push.send(["text", TEXT])
+    assert pull.recv() == [b"text", TEXT]
+    local = spurv.push.connected("inproc://local")
+    local_pull = spurv.pull.bound("inproc://local")
+    local.send(["text", TEXT])
+    assert not is_compressed(local_pull.zmqsock.recv_multipart())
+    spurv.destroy()
+
+def test_decompresses_without_copying():
+    spurv = Spurv(compression=Compression(threshold=100))
+    pull, push = tcp_pair(spurv.pull.socket(), spurv.push.socket())
+    push.send(["text", TEXT])
+    message = pull.recv(decode=[0], copy=False)
+    assert message[0] == u("text")
+    assert message.bytes(1) == TEXT
+    spurv.destroy()
+
+def echo(rep, count):
+    for _ in range(count):
+        rep.send(rep.recv())
+
+def serve_echo(spurv, count):
+    rep = spurv.rep.socket()
+    port = rep.bind_to_random_port("tcp://127.0.0.1")
+    thread = threading.Thread(target=echo, args=(rep, count))
+    thread.daemon = True
+    thread.start()
+    return "tcp://127.0.0.1:{0}".format(port), thread
+
+def test_req_router_round_trip_over_tcp():
+    spurv = Spurv(compression=Compression(threshold=100))
+    router, req = tcp_pair(spurv.router.socket(), spurv.req.socket())
+    req.send(["text", TEXT])
+    identity, empty, text, body = router.recv()
+    assert (empty, text, body) == (b"", b"text", TEXT)
+    router.send([identity, b"", TEXT])
+    assert req.recv() == [TEXT]
+    spurv.destroy()
+
+def test_dealer_client_to_rep_over_tcp():
+    spurv = Spurv(compression=Compression(threshold=100))
+    address, thread = serve_echo(spurv, 1)
+    with spurv.dealer.client(address) as client:
+        assert client.call(["text", TEXT]).result(5) == [b"text", TEXT]
+    thread.join(5)
+    spurv.destroy()
+
+def test_reliable_dealer_to_rep_over_tcp():
+    spurv = Spurv(compression=Compression(threshold=100))
+    address, thread = serve_echo(spurv, 1)
+    with spurv.dealer.reliable([address], timeout=5000) as client:
+        assert client.request(["text", TEXT]) == [b"text", TEXT]
+    thread.join(5)
+    spurv.destroy()
@@ -0,0 +1,65 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import time
+import zmq
+from nose.tools import raises
+from .. import Spurv
+from ..conflate import drain_latest
+from ..enc import u
+
+def test_drain_keeps_newest_per_topic():
+    spurv = Spurv()
+    pull = spurv.pull.bound("inproc://conflate")
+    push = spurv.push.connected("inproc://conflate")
+    for topic, value in [("a", "1"), ("b", "1"), ("a", "2"), ("c", "1")]:
+        push.send([topic, value])
+    time.sleep(0.05)
+    latest = drain_latest(pull)
+    assert latest == [[b"b", b"1"], [b"a", b"2"], [b"c", b"1"]]
+    spurv.destroy()
+
+@raises(zmq.Again)
+def test_drain_without_blocking():
+    spurv = Spurv()
+    drain_latest(spurv.pull.bound("inproc://empty"), flags=zmq.NOBLOCK)
+
+def test_conflating_handler_sees_latest_values():
+    spurv = Spurv()
+    seen = []
+
+    @spurv.sub.listen("inproc://prices", subs="", conflate=True)
+    def price(message):
+        seen.append(message)
+
+    pub = spurv.pub.bound("inproc://prices")
+    handler, = spurv.sub.runners()
+    socket = handler.socket()
+    time.sleep(0.05)
+    for value in range(5):
+        pub.send(["EURUSD", str(value)])
+    pub.send(["GBPUSD", "1"])
+    time.sleep(0.05)
+    handler.serve(socket)
+    assert seen == [[u("EURUSD"), u("4")], [u("GBPUSD"), u("1")]]
+    pub.close()
+    socket.close()
+    spurv.destroy()
+
+def test_late_subscribers_get_a_snapshot():
+    spurv = Spurv()
+    lvc = spurv.xpub.last_value_cache("inproc://lvc")
+    lvc.send(["EURUSD", "1.08"])
+    lvc.send(["EURUSD", "1.09"])
+    lvc.send(["GBPUSD", "1.27"])
+    sub = spurv.sub.connected_subscriber("inproc://lvc", "EUR")
+    assert lvc.process_subscriptions(1000) == 1
+    assert sub.zmqsock.poll(1000)
+    assert sub.recv(decode=True) == [u("EURUSD"), u("1.09")]
+    assert not sub.zmqsock.poll(50)
+    sub.close()
+    lvc.close()
+    spurv.destroy()
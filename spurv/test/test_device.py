@@ -0,0 +1,74 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import time
+import zmq
+from nose.tools import raises
+from .. import Spurv
+from ..device import Proxy
+from ..enc import u
+
+def test_forwarder_passes_on_publications():
+    spurv = Spurv()
+    spurv.proxy(spurv.xsub.bound("inproc://publishers"),
+                spurv.xpub.bound("inproc://subscribers"))
+    sub = spurv.sub.connected_subscriber("inproc://subscribers", "news")
+    pub = spurv.pub.connected("inproc://publishers")
+    time.sleep(0.1)
+    pub.send(["news", "hello"])
+    assert sub.zmqsock.poll(1000)
+    assert sub.recv(decode=True) == [u("news"), u("hello")]
+    pub.close()
+    sub.close()
+    spurv.context.term()
+
+def test_broker_counts_and_samples_traffic():
+    spurv = Spurv()
+    capture = spurv.pull.bound("inproc://capture")
+    proxy = spurv.steerable_proxy(spurv.router.bound("inproc://clients"),
+                                  spurv.dealer.bound("inproc://workers"),
+                                  capture=spurv.push.connected("inproc://capture"),
+                                  sample=2)
+    worker = spurv.rep.connected("inproc://workers")
+    client = spurv.req.connected("inproc://clients")
+    for i in range(2):
+        client.send(str(i))
+        assert worker.zmqsock.poll(1000)
+        worker.send(worker.recv())
+        assert client.zmqsock.poll(1000)
+        assert client.recv(decode=True) == [u(str(i))]
+    for _ in range(2):
+        assert capture.zmqsock.poll(1000)
+        capture.recv()
+    assert proxy.stats()["messages"] == 4
+    assert proxy.terminate(1.0)
+    for socket in (capture, worker, client):
+        socket.close()
+    spurv.context.term()
+
+def test_paused_proxy_holds_messages():
+    spurv = Spurv()
+    proxy = spurv.steerable_proxy(spurv.pull.bound("inproc://in"),
+                                  spurv.push.bound("inproc://out"))
+    pull = spurv.pull.connected("inproc://out")
+    push = spurv.push.connected("inproc://in")
+    proxy.pause()
+    time.sleep(0.05)
+    push.send("held")
+    assert not pull.zmqsock.poll(100)
+    proxy.resume()
+    assert pull.zmqsock.poll(1000)
+    assert pull.recv(decode=True) == [u("held")]
+    assert proxy.terminate(1.0)
+    assert not proxy.running
+    push.close()
+    pull.close()
+    spurv.context.term()
+
+@raises(ValueError)
+def test_sample_must_be_positive():
+    spurv = Spurv()
+    Proxy(spurv.xsub.socket(), spurv.xpub.socket(), sample=0)
@@ -0,0 +1,90 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+from .. import Spurv
+from ..dispatch import PrefixTrie, TopicDispatcher
+from ..enc import u
+
+def test_trie_matches_every_prefix_once():
+    trie = PrefixTrie()
+    trie.add(b"", "all")
+    trie.add(b"ab", "ab")
+    trie.add(b"abc", "abc")
+    trie.add(b"abcd", "ab")
+    trie.add(b"b", "b")
+    assert ["all", "ab", "abc"] == trie.match(b"abcde")
+    assert ["all"] == trie.match(b"a")
+    assert ["all", "b"] == trie.match(b"bcd")
+
+def test_handlers_on_same_address_share_a_dispatcher():
+    with Spurv() as spurv:
+        addr = "inproc://shared"
+        @spurv.sub.listen(addr, subs="one")
+        def one(message):
+            pass
+        @spurv.sub.listen(addr, subs=["two", "three"])
+        def two(message):
+            pass
+        @spurv.sub.listen(addr, subs="one", batch=True)
+        def batched(messages):
+            pass
+        @spurv.sub.listen("inproc://alone", subs="")
+        def alone(message):
+            pass
+        runners = spurv.sub.runners()
+        assert 3 == len(runners)
+        dispatcher = runners[0]
+        assert isinstance(dispatcher, TopicDispatcher)
+        assert [b"one", b"two", b"three"] == dispatcher.subs
+        assert spurv.sub.handler_by_name(batched) is runners[1]
+        assert spurv.sub.handler_by_name(alone) is runners[2]
+
+def test_dispatcher_routes_by_topic():
+    with Spurv() as spurv:
+        addr = "inproc://dispatch"
+        got = []
+        @spurv.sub.listen(addr, subs="one")
+        def one(message):
+            got.append(("one", message))
+        @spurv.sub.listen(addr, subs=["o", "two"], decode=False)
+        def other(message):
+            got.append(("other", message))
+        dispatcher, = spurv.sub.runners()
+        with spurv.pub.bound(addr) as pub:
+            with dispatcher.socket() as socket:
+                pub.send(["one", "1"])
+                pub.send(["two", "2"])
+                pub.send(["three", "3"])
+                pub.send(["one", "4"])
+                for _ in range(3):
+                    dispatcher.serve(socket)
+                assert 0 == socket.zmqsock.poll(10)
+        assert [("other", [b"one", b"1"]),
+                ("one", [u("one"), u("1")]),
+                ("other", [b"two", b"2"]),
+                ("other", [b"one", b"4"]),
+                ("one", [u("one"), u("4")])] == got
+
+def test_dispatched_messages_count_for_each_handler():
+    with Spurv(metrics=True) as spurv:
+        addr = "inproc://dispatch-metrics"
+        @spurv.sub.listen(addr, subs="one")
+        def one(message):
+            pass
+        @spurv.sub.listen(addr, subs="")
+        def every(message):
+            pass
+        dispatcher, = spurv.sub.runners()
+        with spurv.pub.bound(addr) as pub:
+            with dispatcher.socket() as socket:
+                pub.send(["one", "1"])
+                pub.send(["two", "2"])
+                for _ in range(2):
+                    dispatcher.serve(socket)
+        stats = spurv.stats()
+        assert stats["sub:one"]["messages_in"] == 1
+        assert stats["sub:every"]["messages_in"] == 2
+        assert stats["sub:every"]["bytes_in"] == 8
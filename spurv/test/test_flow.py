@@ -0,0 +1,44 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+from nose.tools import raises
+from zmq import Again
+from .. import Spurv
+
+data, credit = "inproc://flow-data", "inproc://flow-credit"
+
+def test_sender_stops_when_window_is_used():
+    with Spurv() as spurv:
+        with spurv.push.credited(data, credit, bind=True, window=4) as push:
+            with spurv.pull.credited(data, credit, bind=False,
+                                     grant=2) as pull:
+                for i in range(4):
+                    push.send(str(i))
+                assert 0 == push.credit
+                try:
+                    push.send("too much", wait=10)
+                    assert 0, "Should have thrown"
+                except Again:
+                    pass
+                for i in range(3):
+                    assert [str(i).encode("ascii")] == pull.recv()
+                push.send("4", wait=1000)
+                assert 1 == push.credit
+
+def test_pull_handler_returns_credit():
+    with Spurv() as spurv:
+        @spurv.pull.listen(data, credit=credit, grant=1)
+        def consume(message):
+            pass
+        handler = spurv.pull.handler_by_name(consume)
+        with spurv.push.credited(data, credit, window=2) as push:
+            with handler.socket() as socket:
+                push.send("1")
+                push.send("2")
+                handler.serve(socket)
+                handler.serve(socket)
+                push.send("3", wait=1000)
+                assert 0 == push.credit
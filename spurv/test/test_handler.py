@@ -0,0 +1,46 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+from nose.tools import raises
+from zmq import Again, NOBLOCK
+from .. import Spurv
+
+def test_pull_handlers_do_not_reply():
+    with Spurv() as spurv:
+        @spurv.pull.listen("inproc://test")
+        def foo(message):
+            pass
+        assert not spurv.pull.handler_by_name(foo).replies
+        @spurv.rep.listen("inproc://test-rep")
+        def bar(message):
+            pass
+        assert spurv.rep.handler_by_name(bar).replies
+
+def test_batch_handler_gets_list_of_messages():
+    with Spurv() as spurv:
+        got = []
+        @spurv.pull.listen("inproc://batch", batch=True)
+        def collect(messages):
+            got.append(messages)
+        handler = spurv.pull.handler_by_name(collect)
+        with handler.socket() as socket:
+            with spurv.push.connected("inproc://batch") as push:
+                for i in range(3):
+                    push.send(str(i))
+                socket.zmqsock.poll()
+                handler.serve(socket)
+        assert 1 == len(got)
+        assert [["0"], ["1"], ["2"]] == got[0]
+
+@raises(Again)
+def test_batch_handler_raises_again_when_empty():
+    with Spurv() as spurv:
+        @spurv.sub.listen("inproc://batch-sub", bind=True, subs="", batch=10)
+        def collect(messages):
+            assert 0, "Should not be called"
+        handler = spurv.sub.handler_by_name(collect)
+        with handler.socket() as socket:
+            handler.serve(socket, NOBLOCK)
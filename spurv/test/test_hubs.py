@@ -4,10 +4,12 @@
 # This file is a part of spurv. It is distributed under the terms
 # of the modified BSD license. The full license is available in
 # LICENSE, distributed as part of this software.
-from ..hub import Sub, Pub, Socket, Req, Rep, HUB_TYPES
+from ..hub import Sub, Pub, Socket, Req, Rep, Push, Pull, HUB_TYPES
 from ..enc import u, is_unicode, is_bytes
+import zmq
 from zmq import Context, ZMQError
 from mock import Mock, MagicMock
+from nose.tools import raises
 
 zmqsock = Mock()
 socket = Socket(zmqsock)
@@ -109,3 +111,35 @@ def test_bind_random_port():
             assert 0, "Should have thrown"
         except ZMQError:
             pass # Expected
+
+def test_recv_batch_drains_queued_messages():
+    with destroying(Context()) as ctx:
+        push, pull = Push(ctx), Pull(ctx)
+        with pull.bound(url) as puller:
+            with push.connected(url) as pusher:
+                for i in range(5):
+                    pusher.send(str(i))
+                first = puller.recv_batch(max_messages=3, decode=True)
+                assert [["0"], ["1"], ["2"]] == first
+                while puller.zmqsock.poll(0) == 0:
+                    pass
+                assert [["3"], ["4"]] == puller.recv_batch(decode=True)
+                assert [] == puller.recv_batch(max_wait=0)
+
+def test_sets_socket_options_by_name():
+    with destroying(Context()) as ctx:
+        pub = Pub(ctx)
+        pub.options = {"linger": 0}
+        with pub.bound(url, sndhwm=10) as publisher:
+            assert 10 == publisher.zmqsock.getsockopt(zmq.SNDHWM)
+            assert 0 == publisher.zmqsock.getsockopt(zmq.LINGER)
+
+@raises(ValueError)
+def test_refuses_unknown_socket_options():
+    with destroying(Context()) as ctx:
+        Pub(ctx).connected(url, no_such_option=1)
+
+@raises(ValueError)
+def test_refuses_socket_options_that_are_not_supported():
+    with destroying(Context()) as ctx:
+        Pub(ctx).connected(url, rcvtimeo=10)
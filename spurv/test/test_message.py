@@ -0,0 +1,44 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+from zmq import Context, Frame
+from ..hub import Push, Pull
+from ..message import Message
+from ..enc import u, is_unicode
+
+def frames(*parts):
+    return [Frame(part) for part in parts]
+
+def test_decodes_lazily():
+    message = Message(frames(u("hødr").encode("utf-8"), b"\x00\x01"), decode=(0,))
+    assert not message._decoded
+    assert u("hødr") == message[0]
+    assert is_unicode(message[0])
+    assert 0 in message._decoded
+    assert isinstance(message[1], memoryview)
+    assert b"\x00\x01" == message[-1].tobytes()
+
+def test_compares_like_a_list():
+    message = Message(frames(b"a", b"b"), decode=True)
+    assert [u("a"), u("b")] == message
+    assert [u("b")] == message[1:]
+    assert 2 == len(message)
+
+def test_recv_without_copy_returns_message():
+    ctx = Context()
+    try:
+        push, pull = Push(ctx), Pull(ctx)
+        with pull.bound("inproc://zerocopy") as puller:
+            with push.connected("inproc://zerocopy") as pusher:
+                payload = b"x" * 100000
+                pusher.send([u("header"), payload])
+                message = puller.recv(decode=(0,), copy=False)
+                assert isinstance(message, Message)
+                assert u("header") == message[0]
+                assert payload == message.buffer(1)
+                assert payload == message.bytes(1)
+    finally:
+        ctx.destroy()
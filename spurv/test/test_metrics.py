@@ -0,0 +1,94 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import json
+import threading
+from .. import Spurv
+from ..metrics import Histogram, Metrics
+
+def test_histogram_percentiles_bound_samples():
+    histogram = Histogram()
+    for _ in range(99):
+        histogram.add(0.001)
+    histogram.add(1.0)
+    assert 100 == histogram.count
+    assert 0.001 <= histogram.percentile(50) < 0.002
+    assert 1.0 == histogram.percentile(100)
+    assert 1.0 == histogram.max
+
+def test_metrics_count_bytes():
+    metrics = Metrics()
+    metrics.received([b"abc", b"de"], 0.5)
+    metrics.sent(b"abcd", 0.25)
+    snapshot = metrics.snapshot()
+    assert 5 == snapshot["bytes_in"]
+    assert 4 == snapshot["bytes_out"]
+    assert 1 == snapshot["messages_in"] == snapshot["messages_out"]
+
+def test_handlers_collect_metrics_only_when_asked():
+    with Spurv() as spurv:
+        @spurv.pull.listen("inproc://quiet")
+        def quiet(message):
+            pass
+        assert spurv.pull.handler_by_name(quiet).metrics is None
+        assert {} == spurv.stats()
+
+def test_handlers_can_opt_in():
+    with Spurv() as spurv:
+        @spurv.pull.listen("inproc://counted", metrics=True)
+        def counted(message):
+            pass
+
+        @spurv.pull.listen("inproc://uncounted")
+        def uncounted(message):
+            pass
+
+        assert spurv.pull.handler_by_name(counted).metrics is not None
+        assert spurv.pull.handler_by_name(uncounted).metrics is None
+        assert list(spurv.stats()) == ["pull:counted"]
+
+def test_serving_records_metrics():
+    with Spurv(metrics=True) as spurv:
+        @spurv.rep.listen("inproc://metrics")
+        def echo(message):
+            if message == ["fail"]:
+                raise ValueError(message)
+            return message
+        handler = spurv.rep.handler_by_name(echo)
+        with handler.socket() as socket:
+            with spurv.req.connected("inproc://metrics") as req:
+                req.send("hello")
+                handler.serve(socket)
+                req.recv()
+                req.send("fail")
+                try:
+                    handler.serve(socket)
+                    assert 0, "Should have thrown"
+                except ValueError:
+                    pass
+        stats = spurv.stats()["rep:echo"]
+        assert 2 == stats["messages_in"]
+        assert 1 == stats["messages_out"]
+        assert 9 == stats["bytes_in"]
+        assert 1 == stats["errors"]
+        assert 2 == stats["handler_time"]["count"]
+
+def test_publishes_stats():
+    spurv = Spurv(metrics=True)
+    @spurv.pull.listen("inproc://published")
+    def foo(message):
+        pass
+    addr = "inproc://stats"
+    publisher = threading.Thread(target=spurv.publish_stats,
+                                 args=(addr, 0.01))
+    publisher.start()
+    try:
+        with spurv.sub.connected_subscriber(addr, "spurv.stats") as sub:
+            topic, stats = sub.recv(decode=True)
+        assert "pull:foo" in json.loads(stats)
+    finally:
+        spurv.context.term()
+        publisher.join()
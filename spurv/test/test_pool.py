@@ -0,0 +1,72 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import threading
+import time
+from nose.tools import raises
+from .. import Spurv
+from ..enc import u
+from ..pool import RequestTimeout
+
+def echo_server(spurv, addr, count):
+    socket = spurv.rep.bound(addr)
+    def serve():
+        with socket:
+            for _ in range(count):
+                socket.send(socket.recv())
+    thread = threading.Thread(target=serve)
+    thread.start()
+    return thread
+
+def test_reuses_idle_sockets():
+    with Spurv() as spurv:
+        addr = "inproc://pooled"
+        server = echo_server(spurv, addr, 3)
+        pool = spurv.req.pool(addr, max_size=2)
+        assert pool is spurv.req.pool(addr)
+        for i in range(3):
+            assert [u(str(i))] == spurv.req.request(addr, str(i), decode=True)
+        assert 1 == pool.size
+        server.join()
+        pool.close()
+        assert 0 == pool.size
+
+def test_discards_sockets_that_time_out():
+    with Spurv() as spurv:
+        addr = "inproc://silent"
+        with spurv.rep.bound(addr):
+            pool = spurv.req.pool(addr)
+            try:
+                pool.request("hello", timeout=10)
+                assert 0, "Should have thrown"
+            except RequestTimeout:
+                pass
+            assert 0 == pool.size
+
+@raises(RequestTimeout)
+def test_waits_for_sockets_when_full():
+    with Spurv() as spurv:
+        pool = spurv.req.pool("inproc://full", max_size=1)
+        with pool.socket():
+            pool.checkout(wait=10)
+
+def test_timeout_includes_waiting_for_a_socket():
+    with Spurv() as spurv:
+        addr = "inproc://slow-pool"
+        with spurv.rep.bound(addr):
+            pool = spurv.req.pool(addr, max_size=1)
+            socket = pool.checkout()
+            timer = threading.Timer(0.2, pool.checkin, [socket])
+            timer.start()
+            started = time.time()
+            try:
+                pool.request("hello", timeout=300)
+                assert 0, "Should have thrown"
+            except RequestTimeout:
+                pass
+            assert time.time() - started < 0.45
+            timer.join()
+            pool.close()
@@ -0,0 +1,73 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import threading
+import time
+from .. import Spurv
+from ..enc import u
+
+def test_reactor_serves_all_handlers_from_one_thread():
+    with Spurv() as spurv:
+        threads = set()
+
+        @spurv.rep.listen("inproc://reactor-one")
+        def one(message):
+            threads.add(threading.current_thread())
+            return [u("one")] + message
+
+        @spurv.rep.listen("inproc://reactor-two")
+        def two(message):
+            threads.add(threading.current_thread())
+            return [u("two")] + message
+
+        reactor = spurv.reactor(timeout=10)
+        thread = threading.Thread(target=reactor.run)
+        thread.start()
+        try:
+            while not reactor.running:
+                time.sleep(0.01)
+            for name in ("one", "two"):
+                with spurv.req.connected(spurv.url_to(name)) as req:
+                    req.send("hi")
+                    assert [u(name), u("hi")] == req.recv(decode=True)
+        finally:
+            reactor.stop()
+            thread.join()
+        assert 1 == len(threads)
+        assert thread in threads
+
+def test_failing_handlers_do_not_stop_the_others():
+    with Spurv() as spurv:
+        @spurv.rep.listen("inproc://reactor-failing")
+        def failing(message):
+            if message == [u("fail")]:
+                raise ValueError(message)
+            return message
+
+        @spurv.pull.listen("inproc://reactor-pulled")
+        def pulled(message):
+            raise ValueError(message)
+
+        reactor = spurv.reactor(timeout=10)
+        thread = threading.Thread(target=reactor.run)
+        thread.start()
+        try:
+            while not reactor.running:
+                time.sleep(0.01)
+            with spurv.push.connected(spurv.url_to("pulled")) as push:
+                push.send("boom")
+            with spurv.req.connected(spurv.url_to("failing")) as req:
+                req.send("fail")
+                assert [b""] == req.recv()
+                req.send("ok")
+                assert [u("ok")] == req.recv(decode=True)
+            while reactor.errors < 2:
+                time.sleep(0.01)
+            assert reactor.running
+        finally:
+            reactor.stop()
+            thread.join()
+        assert 2 == reactor.errors
@@ -0,0 +1,91 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import threading
+from nose.tools import raises
+from .. import Spurv
+from ..codec import Pickle
+from ..enc import u
+from ..metrics import clock
+from ..pool import RequestTimeout
+from ..reliable import Endpoint, ReliableClient
+
+def serve(socket, count):
+    def reply():
+        with socket:
+            for _ in range(count):
+                socket.send(socket.recv())
+    thread = threading.Thread(target=reply)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def free_port(spurv):
+    # A port nothing listens on, found by binding and unbinding it.
+    with spurv.rep.socket() as socket:
+        return socket.bind_to_random_port("tcp://127.0.0.1")
+
+def test_moving_average_of_latency():
+    endpoint = Endpoint("tcp://a:5555")
+    endpoint.replied(1.0, 0.5)
+    endpoint.replied(3.0, 0.5)
+    assert endpoint.latency == 2.0
+
+def test_prefers_fast_endpoints():
+    client = ReliableClient(None, ["a", "b", "c"])
+    fast, slow, down = client.endpoints
+    fast.latency, slow.latency, down.latency = 0.001, 1.0, 0.0001
+    down.failed(clock(), 1000000, 1000000)
+    picks = [client.select() for _ in range(200)]
+    assert down not in picks
+    assert picks.count(fast) > picks.count(slow)
+
+def test_fails_over_to_live_endpoint():
+    spurv = Spurv()
+    dead_port = free_port(spurv)
+    live = spurv.rep.socket()
+    port = live.bind_to_random_port("tcp://127.0.0.1")
+    server = serve(live, 3)
+    client = spurv.req.reliable(["tcp://127.0.0.1:{0}".format(dead_port),
+                                 "tcp://127.0.0.1:{0}".format(port)],
+                                timeout=100, retries=1)
+    dead = client.endpoints[0]
+    for _ in range(3):
+        assert client.request("ping", decode=True) == [u("ping")]
+    assert dead.failures <= 1
+    assert client.endpoints[1].latency is not None
+    server.join(1.0)
+    client.close()
+    spurv.destroy()
+
+def test_dealer_client_strips_the_envelope():
+    spurv = Spurv()
+    server = serve(spurv.rep.bound("inproc://reliable-dealer"), 1)
+    with spurv.dealer.reliable(["inproc://reliable-dealer"]) as client:
+        assert client.request(["a", "b"]) == [b"a", b"b"]
+    server.join(1.0)
+    spurv.destroy()
+
+@raises(RequestTimeout)
+def test_gives_up_after_retries():
+    spurv = Spurv()
+    address = "tcp://127.0.0.1:{0}".format(free_port(spurv))
+    client = spurv.req.reliable([address], timeout=20, retries=2,
+                                heartbeat=100)
+    try:
+        client.request("ping")
+    finally:
+        assert client.endpoints[0].failures == 3
+        client.close()
+        spurv.destroy()
+
+def test_decodes_replies_with_the_codec():
+    spurv = Spurv(codec=Pickle())
+    server = serve(spurv.rep.bound("inproc://reliable-pickle"), 1)
+    with spurv.req.reliable(["inproc://reliable-pickle"]) as client:
+        assert client.request({"key": [1, 2]}) == {"key": [1, 2]}
+    server.join(1.0)
+    spurv.destroy()
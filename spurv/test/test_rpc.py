@@ -0,0 +1,62 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import asyncio
+import threading
+import time
+from .. import Spurv
+from ..enc import u
+from ..pool import RequestTimeout
+
+def test_replies_are_matched_out_of_order():
+    spurv = Spurv()
+    addr = "inproc://rpc"
+
+    @spurv.rep.listen(addr, concurrency=4)
+    def sleepy(message):
+        time.sleep(float(message[0]))
+        return message
+
+    for runner in spurv.rep.runners():
+        thread = threading.Thread(target=runner.start)
+        thread.daemon = True
+        thread.start()
+    try:
+        with spurv.dealer.client(addr, decode=True) as client:
+            slow = client.call("0.2")
+            fast = client.call("0.01")
+            assert [u("0.01")] == fast.result(1)
+            assert not slow.done()
+            assert [u("0.2")] == slow.result(1)
+            assert 0 == client.in_flight
+    finally:
+        spurv.context.term()
+
+def test_requests_time_out():
+    with Spurv() as spurv:
+        addr = "inproc://rpc-silent"
+        with spurv.rep.bound(addr):
+            with spurv.dealer.client(addr) as client:
+                future = client.call("hello", timeout=20)
+                try:
+                    future.result(1)
+                    assert 0, "Should have thrown"
+                except RequestTimeout:
+                    pass
+
+def test_awaitable_calls():
+    with Spurv() as spurv:
+        addr = "inproc://rpc-async"
+        with spurv.rep.bound(addr) as rep:
+            with spurv.dealer.client(addr, decode=True) as client:
+                async def call():
+                    return await client.call_async("hi")
+                def reply():
+                    rep.send([u("re")] + rep.recv())
+                thread = threading.Thread(target=reply)
+                thread.start()
+                assert [u("re"), u("hi")] == asyncio.run(call())
+                thread.join()
@@ -0,0 +1,103 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import os
+import shutil
+import tempfile
+from nose.tools import raises
+from .. import Spurv
+from ..enc import u
+from ..runner import ProcessRunner, ThreadRunner, io_threads_for
+
+def test_replicas_are_spread_over_processes():
+    spurv = Spurv()
+
+    @spurv.pull.listen("inproc://runner-work", bind=False)
+    def work(message):
+        pass
+
+    @spurv.sub.listen("inproc://runner-watch", subs="")
+    def watch(message):
+        pass
+
+    runner = ProcessRunner(spurv, processes=3, replicas={work: 3})
+    assigned = runner.assignments()
+    assert len(assigned) == 3
+    assert all(len(runners) >= 1 for runners in assigned)
+    assert sum(len(runners) for runners in assigned) == 4
+    spurv.destroy()
+
+def test_unused_processes_are_not_started():
+    spurv = Spurv()
+
+    @spurv.pull.listen("inproc://runner-unused", bind=False)
+    def work(message):
+        pass
+
+    assert len(ProcessRunner(spurv, processes=4).assignments()) == 1
+    spurv.destroy()
+
+@raises(ValueError)
+def test_bound_handlers_can_not_be_replicated():
+    spurv = Spurv()
+
+    @spurv.rep.listen("inproc://runner-bound")
+    def echo(message):
+        return message
+
+    ProcessRunner(spurv, processes=2, replicas={"echo": 2}).assignments()
+
+def test_workers_serve_from_other_processes():
+    spurv = Spurv()
+    directory = tempfile.mkdtemp()
+    addr = "ipc://" + os.path.join(directory, "runner")
+
+    @spurv.rep.listen(addr)
+    def pid(message):
+        return str(os.getpid())
+
+    runner = ProcessRunner(spurv, processes=1)
+    runner.start()
+    try:
+        with spurv.req.connected(addr) as req:
+            req.send("pid")
+            assert req.zmqsock.poll(5000)
+            reply = req.recv(decode=True)
+        assert reply != [u(str(os.getpid()))]
+        assert reply == [u(str(runner.pids[0]))]
+    finally:
+        runner.terminate()
+        spurv.destroy()
+        shutil.rmtree(directory)
+
+def test_io_threads_follow_tcp_endpoints():
+    assert io_threads_for(0, cpus=4) == 1
+    assert io_threads_for(8, cpus=4) == 1
+    assert io_threads_for(9, cpus=4) == 2
+    assert io_threads_for(100, cpus=4) == 4
+
+def test_thread_runner_spreads_handlers_and_reports_time():
+    spurv = Spurv()
+    for index in range(3):
+        def echo(message):
+            return message
+        echo.__name__ = "echo{0}".format(index)
+        spurv.rep.listen("inproc://threads-{0}".format(index))(echo)
+
+    runner = ThreadRunner(spurv, threads=2, timeout=10)
+    assert [len(r.handlers) for r in runner.reactors] == [2, 1]
+    runner.start()
+    for index in range(3):
+        with spurv.req.connected("inproc://threads-{0}".format(index)) as req:
+            req.send("ping")
+            assert req.recv(decode=True) == [u("ping")]
+    runner.stop(1.0)
+    stats = runner.stats()
+    assert sum(thread["served"] for thread in stats) == 3
+    assert stats[0]["handlers"] == ["rep:echo0", "rep:echo2"]
+    assert all(thread["idle"] > 0 for thread in stats)
+    assert 0 <= stats[0]["utilization"] < 1
+    spurv.destroy()
@@ -0,0 +1,108 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import os
+import time
+from nose.plugins.skip import SkipTest
+from nose.tools import raises
+from .. import Spurv, shm
+from ..enc import u
+
+BLOB = os.urandom(64 * 1024)
+
+def setup():
+    if shm.shared_memory is None:
+        raise SkipTest("multiprocessing.shared_memory is not available")
+
+def segment_exists(handle):
+    name = handle[shm._handle.size:].decode("ascii")
+    return os.path.exists(os.path.join("/dev/shm", name))
+
+def test_large_frames_are_passed_by_handle():
+    spurv = Spurv(shared_memory=shm.SharedMemory(threshold=1024))
+    pull = spurv.pull.bound("inproc://blobs")
+    push = spurv.push.connected("inproc://blobs")
+    push.send(["small", BLOB])
+    raw = pull.zmqsock.recv_multipart()
+    assert shm.is_shared(raw)
+    assert raw[0] == b"small" and len(raw[1]) < 100
+    push.send(["small", BLOB])
+    message = pull.recv()
+    assert message[0] == b"small"
+    assert isinstance(message[1], memoryview) and message[1] == BLOB
+    handle = raw[1]
+    shm.receive(raw, unlink=True)
+    assert not segment_exists(handle)
+    del message
+    spurv.destroy()
+
+def test_not_used_over_tcp():
+    spurv = Spurv(shared_memory=shm.SharedMemory(threshold=1024))
+    pull = spurv.pull.socket()
+    port = pull.bind_to_random_port("tcp://127.0.0.1")
+    push = spurv.push.connected("tcp://127.0.0.1:{0}".format(port))
+    push.send(BLOB)
+    assert pull.zmqsock.recv_multipart() == [BLOB]
+    spurv.destroy()
+
+def victim():
+    name = "{0}victim-{1}".format(shm.PREFIX, os.getpid())
+    segment = shm.shared_memory.SharedMemory(name, create=True, size=16)
+    shm._untrack(segment)
+    return segment, shm._handle.pack(16) + name.encode("ascii")
+
+def test_remote_peers_can_not_unlink_segments():
+    spurv = Spurv()
+    segment, handle = victim()
+    pull = spurv.pull.socket()
+    port = pull.bind_to_random_port("tcp://127.0.0.1")
+    push = spurv.push.connected("tcp://127.0.0.1:{0}".format(port))
+    push.send([handle, shm.SHARED + b"\x01"])
+    assert pull.recv() == [handle, shm.SHARED + b"\x01"]
+    assert segment_exists(handle)
+    segment.close()
+    shm._unlink(segment)
+    spurv.destroy()
+
+@raises(ValueError)
+def test_only_spurv_segments_are_mapped():
+    spurv = Spurv(shared_memory=shm.SharedMemory(threshold=1024))
+    pull = spurv.pull.bound("inproc://foreign")
+    push = spurv.push.connected("inproc://foreign")
+    push.send([shm._handle.pack(16) + b"not-spurv", shm.SHARED + b"\x01"])
+    try:
+        pull.recv()
+    finally:
+        spurv.destroy()
+
+def test_flags_skip_the_envelope():
+    spurv = Spurv(shared_memory=shm.SharedMemory(threshold=1024))
+    router = spurv.router.bound("inproc://shared-router")
+    req = spurv.req.connected("inproc://shared-router")
+    req.send(["small", BLOB])
+    identity, empty, small, blob = router.recv()
+    assert empty == b"" and small == b"small" and blob == BLOB
+    router.send([identity, b"", BLOB])
+    reply, = req.recv()
+    assert isinstance(reply, memoryview) and reply == BLOB
+    del reply, blob
+    spurv.destroy()
+
+def test_published_segments_are_leased():
+    policy = shm.SharedMemory(threshold=1024, lease=0.05)
+    spurv = Spurv(shared_memory=policy)
+    pub = spurv.pub.bound("inproc://shared-pub")
+    sub = spurv.sub.connected_subscriber("inproc://shared-pub", "blob")
+    time.sleep(0.05)
+    pub.send(["blob", BLOB])
+    assert sub.zmqsock.poll(1000)
+    raw = sub.zmqsock.recv_multipart()
+    assert segment_exists(raw[1])
+    assert bytes(shm.receive(raw, unlink=False)[1]) == BLOB
+    time.sleep(0.06)
+    policy.expire()
+    assert not segment_exists(raw[1])
+    spurv.destroy()
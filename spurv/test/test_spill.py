@@ -0,0 +1,75 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import os
+import shutil
+import tempfile
+import zmq
+from .. import Spurv
+from ..enc import u
+from ..spill import SpillQueue
+
+def drain(queue):
+    messages = []
+    while len(queue):
+        offset, frames = queue.peek()
+        queue.pop(offset)
+        messages.append(frames)
+    return messages
+
+def test_queue_rolls_over_and_removes_segments():
+    directory = tempfile.mkdtemp()
+    try:
+        queue = SpillQueue(directory, segment_size=64)
+        for i in range(10):
+            queue.append([b"topic", str(i).encode("ascii") * 8])
+        assert len(os.listdir(directory)) > 3
+        assert drain(queue) == [[b"topic", str(i).encode("ascii") * 8]
+                                for i in range(10)]
+        segments = [name for name in os.listdir(directory)
+                    if name.endswith(".seg")]
+        assert len(segments) == 1
+        queue.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_queue_resumes_from_cursor():
+    directory = tempfile.mkdtemp()
+    try:
+        queue = SpillQueue(directory, segment_size=1024)
+        for i in range(4):
+            queue.append([str(i).encode("ascii")])
+        offset, _ = queue.peek()
+        queue.pop(offset)
+        queue.close()
+        queue = SpillQueue(directory, segment_size=1024)
+        assert len(queue) == 3
+        assert drain(queue) == [[b"1"], [b"2"], [b"3"]]
+        queue.append([b"4"])
+        assert drain(queue) == [[b"4"]]
+        queue.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_spills_without_peers_and_replays_in_order():
+    directory = tempfile.mkdtemp()
+    spurv = Spurv()
+    try:
+        push = spurv.push.spilling("inproc://spill", directory, bind=True)
+        for i in range(3):
+            assert not push.send(["event", str(i)])
+        assert push.spilled == 3
+        pull = spurv.pull.connected("inproc://spill")
+        assert push.zmqsock.poll(1000, zmq.POLLOUT)
+        assert push.send(["event", "3"])
+        assert push.spilled == 0
+        received = [pull.recv(decode=True) for _ in range(4)]
+        assert received == [[u("event"), u(str(i))] for i in range(4)]
+        pull.close()
+        push.close()
+    finally:
+        spurv.destroy()
+        shutil.rmtree(directory)
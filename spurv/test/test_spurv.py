@@ -6,6 +6,7 @@
 # LICENSE, distributed as part of this software.
 from .. import Spurv
 from nose.tools import raises
+import zmq
 
 def test_constructing_radmq_object():
     ctx = Spurv()
@@ -31,3 +32,9 @@ def test_gets_url_to_registered_handler():
             return msg
         assert addr == spurv.url_to(foo)
         assert addr == spurv.url_to(bar)
+
+def test_context_level_settings():
+    with Spurv(io_threads=2, options={"linger": 0}) as spurv:
+        assert 2 == spurv.context.get(zmq.IO_THREADS)
+        with spurv.req.socket() as socket:
+            assert 0 == socket.zmqsock.getsockopt(zmq.LINGER)
@@ -0,0 +1,61 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+from .. import Spurv
+from ..enc import u
+from ..trace import Tracer, is_traced
+
+def test_unsampled_messages_are_sent_as_is():
+    spurv = Spurv(tracer=Tracer(sample_rate=0.0))
+    pull = spurv.pull.bound("inproc://untraced")
+    push = spurv.push.connected("inproc://untraced")
+    push.send(["a", "b"])
+    assert not is_traced(pull.zmqsock.recv_multipart())
+    spurv.destroy()
+
+def test_trace_frame_is_stripped_and_carried_on():
+    tracer = Tracer(sample_rate=1.0)
+    spurv = Spurv(tracer=tracer)
+    forwarded = []
+
+    @spurv.pull.listen("inproc://stage-one")
+    def stage_one(message):
+        next_stage.send(message)
+
+    @spurv.pull.listen("inproc://stage-two")
+    def stage_two(message):
+        forwarded.append(message)
+
+    one, two = spurv.pull.runners()
+    one_socket, two_socket = one.socket(), two.socket()
+    next_stage = spurv.push.connected("inproc://stage-two")
+    source = spurv.push.connected("inproc://stage-one")
+    source.send(["work", "1"])
+    one.serve(one_socket)
+    two.serve(two_socket)
+    assert forwarded == [[u("work"), u("1")]]
+    first, second = tracer.spans
+    assert first["trace"] == second["trace"]
+    assert (first["hop"], first["name"]) == (0, "pull:stage_one")
+    assert (second["hop"], second["name"]) == (1, "pull:stage_two")
+    assert tracer.snapshot()["pull:stage_two"]["handler_time"]["count"] == 1
+    for socket in (one_socket, two_socket, next_stage, source):
+        socket.close()
+    spurv.destroy()
+
+def test_plain_sends_do_not_carry_received_traces():
+    tracer = Tracer(sample_rate=1.0)
+    spurv = Spurv(tracer=tracer)
+    pull = spurv.pull.bound("inproc://plain")
+    push = spurv.push.connected("inproc://plain")
+    push.send("first")
+    assert pull.recv() == [b"first"]
+    assert tracer.current().hop == 0
+    tracer.sample_rate = 0.0
+    push.send("second")
+    assert pull.recv() == [b"second"]
+    assert tracer.current() is None
+    spurv.destroy()
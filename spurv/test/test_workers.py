@@ -0,0 +1,75 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+import os
+import shutil
+import tempfile
+import threading
+import time
+from nose.tools import raises
+from zmq import Context
+from .. import Spurv
+from ..enc import u
+from ..workers import WorkerPool
+
+def serve_in_background(spurv):
+    threads = [threading.Thread(target=handler.start)
+               for handler in spurv.handlers()]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+def test_thread_workers_serve_requests_concurrently():
+    spurv = Spurv()
+    addr = "inproc://workers"
+
+    @spurv.rep.listen(addr, concurrency=4)
+    def slow(message):
+        time.sleep(0.2)
+        return message
+
+    serve_in_background(spurv)
+    time.sleep(0.05)
+    replies = []
+    def request(i):
+        with spurv.req.connected(addr) as req:
+            req.send(str(i))
+            replies.append(req.recv(decode=True))
+    clients = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    started = time.time()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    assert time.time() - started < 0.6
+    assert sorted(replies) == [[u(str(i))] for i in range(4)]
+    spurv.context.term()
+
+def test_process_workers_reply_from_other_processes():
+    spurv = Spurv()
+    directory = tempfile.mkdtemp()
+    addr = "ipc://" + os.path.join(directory, "workers")
+
+    @spurv.rep.listen(addr, concurrency=2, workers="process")
+    def pid(message):
+        return str(os.getpid())
+
+    serve_in_background(spurv)
+    try:
+        with spurv.req.connected(addr) as req:
+            req.send("pid")
+            assert [u(str(os.getpid()))] != req.recv(decode=True)
+    finally:
+        spurv.context.term()
+        shutil.rmtree(directory)
+
+@raises(ValueError)
+def test_rejects_unknown_worker_kind():
+    with Spurv() as spurv:
+        @spurv.rep.listen("inproc://nope", concurrency=2, workers="fiber")
+        def foo(message):
+            pass
+        WorkerPool(spurv.rep.handler_by_name(foo), 2, "fiber")
@@ -0,0 +1,137 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Following sampled messages through a pipeline.
+
+A Spurv created with a Tracer adds a small trace frame to a sample of
+the messages it sends, and takes it off again when they are received,
+so handlers never see it:
+
+    tracer = Tracer(sample_rate=0.01)
+    ctx = Spurv(tracer=tracer)
+
+For each traced message a handler gets, the tracer records how long the
+message spent between being sent and received (queue time), and how
+long the handler took. Messages a handler sends while handling a traced
+message carry the trace on, one hop further, so a trace follows a
+message through every stage of a Push/Pull pipeline. Replies sent by
+Rep handlers are sent after the handler returns, so they do not carry on
+the trace of the request, but like any other message they may be sampled
+to start a trace of their own. Recorded spans are kept in tracer.spans,
+and summed up per handler by tracer.snapshot().
+
+The trace frame goes last, not first, so SUB sockets still filter on
+the topic and ROUTER envelopes are left alone:
+
+    [frames..., TRACE + trace id, hop, send time]
+
+Messages that are not sampled get no frame, and cost one random number
+on sending. Queue times are measured with the wall clock, so between
+hosts they are only as good as the clocks are synchronised.
+"""
+import collections
+import random
+import struct
+import threading
+import time
+
+from .metrics import Histogram
+
+TRACE = b"\x00spurv-trace\x00"
+
+_context = struct.Struct("!QId")
+_frame_size = len(TRACE) + _context.size
+
+class Span(object):
+    """The trace context of a received message."""
+
+    __slots__ = ("trace_id", "hop", "sent", "received")
+
+    def __init__(self, trace_id, hop, sent, received):
+        self.trace_id = trace_id
+        self.hop = hop
+        self.sent = sent
+        self.received = received
+
+    @property
+    def queue_time(self):
+        return max(self.received - self.sent, 0.0)
+
+def is_traced(frames):
+    """Whether a received message ends with a trace frame."""
+    if len(frames) < 2 or len(frames[-1]) != _frame_size:
+        return False
+    last = frames[-1]
+    return getattr(last, "bytes", last)[:len(TRACE)] == TRACE
+
+class Tracer(object):
+    """Decides which messages to trace and records their spans."""
+
+    def __init__(self, sample_rate=0.01, max_spans=10000):
+        """Arguments:
+        - `sample_rate`: The fraction of messages to start a trace for.
+        - `max_spans`: How many of the most recent spans to keep.
+        """
+        self.sample_rate = sample_rate
+        self.spans = collections.deque(maxlen=max_spans)
+        self.queue_times = collections.defaultdict(Histogram)
+        self.handler_times = collections.defaultdict(Histogram)
+        self._local = threading.local()
+        self._random = random.random
+
+    def current(self):
+        """The span of the message last received by this thread, if it
+        was traced."""
+        return getattr(self._local, "received", None)
+
+    def begin(self, span):
+        """Carry span on to what this thread sends until finish."""
+        self._local.active = span
+
+    def outgoing(self):
+        """The trace frame to add to a message being sent, or None."""
+        span = getattr(self._local, "active", None)
+        if span is not None:
+            return TRACE + _context.pack(span.trace_id, span.hop + 1,
+                                         time.time())
+        if self._random() < self.sample_rate:
+            trace_id = random.getrandbits(64)
+            return TRACE + _context.pack(trace_id, 0, time.time())
+        return None
+
+    def incoming(self, frames):
+        """Strip the trace frame, if any, off a received message and make
+        it the current span of this thread."""
+        if not is_traced(frames):
+            self._local.received = None
+            return frames
+        last = frames[-1]
+        trace_id, hop, sent = _context.unpack_from(
+            getattr(last, "bytes", last), len(TRACE))
+        self._local.received = Span(trace_id, hop, sent, time.time())
+        return frames[:-1]
+
+    def finish(self, span, name, elapsed):
+        """Record that the handler called name took elapsed seconds to
+        handle the message of span."""
+        self._local.active = None
+        self.queue_times[name].add(span.queue_time)
+        self.handler_times[name].add(elapsed)
+        self.spans.append({"trace": span.trace_id, "hop": span.hop,
+                           "name": name, "queue": span.queue_time,
+                           "handler": elapsed})
+
+    def snapshot(self):
+        """Queue and handler time histograms per handler name."""
+        return dict((name, {
+            "queue_time": self.queue_times[name].snapshot(),
+            "handler_time": self.handler_times[name].snapshot(),
+        }) for name in list(self.handler_times))
+
+    def __repr__(self):
+        return "<Tracer({0}, {1} spans)>".format(self.sample_rate,
+                                                 len(self.spans))
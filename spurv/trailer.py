@@ -0,0 +1,59 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Flag frames at the end of messages.
+
+spurv.compress and spurv.shm replace some frames of the messages they
+send, and tell receivers which ones in a flag frame added at the end:
+
+    [envelope..., frames..., marker + header + one byte per frame]
+
+The marker tells what was done to the frames, and the header holds
+whatever else receivers need, like the id of a compressor. The flags
+only cover the frames after the envelope of ROUTER and DEALER messages,
+the frames up to the first empty one, since zmq adds and strips envelope
+frames on the way. Receivers find the flag frame by its marker, and
+apply the flags to the frames right before it.
+"""
+import zmq
+
+ENVELOPED = (zmq.ROUTER, zmq.DEALER)
+
+def envelope(socktype, frames):
+    """The number of envelope frames a message sent on a socket of
+    socktype starts with."""
+    if socktype in ENVELOPED:
+        for index, frame in enumerate(frames):
+            if not len(frame):
+                return index + 1
+    return 0
+
+def flag_frame(marker, flags, header=b""):
+    """The flag frame for the frames after the envelope of a message,
+    given whether each of them is flagged."""
+    return marker + header + b"".join(b"\x01" if flag else b"\x00"
+                                      for flag in flags)
+
+def is_flagged(frames, marker, header=0):
+    """Whether a received message ends with a flag frame with marker and
+    a header of header bytes."""
+    if len(frames) < 2:
+        return False
+    count = len(frames[-1]) - len(marker) - header
+    if not 0 < count < len(frames):
+        return False
+    last = frames[-1]
+    return getattr(last, "bytes", last)[:len(marker)] == marker
+
+def read(frames, marker, header=0):
+    """The header of the flag frame of a message that is_flagged, and
+    for each of the other frames whether it is flagged."""
+    last = getattr(frames[-1], "bytes", frames[-1])[len(marker):]
+    head, flags = last[:header], last[header:]
+    uncovered = len(frames) - 1 - len(flags)
+    return head, [False] * uncovered + [flags[index:index + 1] == b"\x01"
+                                        for index in range(len(flags))]
@@ -0,0 +1,135 @@
+# coding=utf-8
+# Copyright (c) 2013 Robin Kåveland Hansen
+#
+# This file is a part of spurv. It is distributed under the terms
+# of the modified BSD license. The full license is available in
+# LICENSE, distributed as part of this software.
+"""
+Running a reply handler on several workers at once.
+
+A WorkerPool puts a ROUTER socket on the address of a handler and a
+DEALER socket on a private back-end address, and runs zmq.proxy between
+the two. Each worker connects a REP socket to the back-end and serves
+the handler on it. Requests are spread over idle workers, and since the
+ROUTER keeps the envelope of each request, replies find their way back
+to the right client. Clients can not tell the difference from a single
+REP socket, except that one slow request no longer holds up the rest.
+"""
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zmq
+
+WORKER_KINDS = ("thread", "process")
+
+_pool_ids = itertools.count()
+
+def _serve_forever(handler, socket):
+    with socket:
+        while True:
+            handler.serve(socket)
+
+def _thread_worker(handler, backend):
+    try:
+        socket = handler.prepare(handler.hub.connected(backend))
+        _serve_forever(handler, socket)
+    except zmq.ContextTerminated:
+        pass
+
+def _process_worker(handler, backend):
+    # The context of the parent must not be used after forking, so the
+    # worker gets a fresh hub of the same kind to create its socket from.
+    hub = handler.hub
+    local = type(hub)(zmq.Context(), hub.socket_class, hub.encoding, hub.codec)
+    local.options = hub.options
+    local.tracer = hub.tracer
+    local.compression = hub.compression
+    local.shared_memory = hub.shared_memory
+    # Each process has its own copy of the cache to keep up to date.
+    handler.follow(local.context)
+    _serve_forever(handler, handler.prepare(local.connected(backend)))
+
+class WorkerPool(object):
+    """Serves a reply handler on `concurrency` workers.
+
+    `kind` is either "thread" or "process". Thread workers share the
+    context of the handler and talk to the back-end over inproc. Process
+    workers are forked, get their own context and talk to the back-end
+    over ipc, so they can use more than one core even for handlers that
+    hold on to the GIL.
+    """
+
+    def __init__(self, handler, concurrency, kind="thread"):
+        if kind not in WORKER_KINDS:
+            raise ValueError("Unknown kind of worker: {0}".format(kind))
+        self.handler = handler
+        self.concurrency = concurrency
+        self.kind = kind
+        self._tempdir = None
+
+    def _backend_address(self):
+        if self.kind == "thread":
+            return "inproc://spurv-workers-{0}".format(next(_pool_ids))
+        self._tempdir = tempfile.mkdtemp(prefix="spurv-")
+        return "ipc://" + os.path.join(self._tempdir, "backend")
+
+    def _socket(self, socktype):
+        hub = self.handler.hub
+        return hub._wrap(hub._socket(socktype))
+
+    def _frontend(self):
+        socket = self._socket(zmq.ROUTER)
+        self.handler.hub.configure(socket, **self.handler.sockopts)
+        if self.handler.bind:
+            socket.bind(self.handler.addr)
+        else:
+            socket.connect(self.handler.addr)
+        return socket
+
+    def _backend(self, address):
+        socket = self._socket(zmq.DEALER)
+        socket.bind(address)
+        return socket
+
+    def _start_workers(self, backend):
+        workers = []
+        for _ in range(self.concurrency):
+            if self.kind == "thread":
+                worker = threading.Thread(target=_thread_worker,
+                                          args=(self.handler, backend))
+            else:
+                fork = multiprocessing.get_context("fork")
+                worker = fork.Process(target=_process_worker,
+                                      args=(self.handler, backend))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        return workers
+
+    def run(self):
+        """Start the workers and forward requests to them until the
+        context is terminated."""
+        backend_address = self._backend_address()
+        workers = []
+        if self.kind == "thread":
+            self.handler.follow()
+        try:
+            with self._frontend() as frontend:
+                with self._backend(backend_address) as backend:
+                    workers = self._start_workers(backend_address)
+                    zmq.proxy(frontend.zmqsock, backend.zmqsock)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            for worker in workers:
+                if self.kind == "process":
+                    worker.terminate()
+            if self._tempdir is not None:
+                shutil.rmtree(self._tempdir, ignore_errors=True)
+
+    def __repr__(self):
+        return "<WorkerPool({0}, {1} {2}s)>".format(
+            self.handler, self.concurrency, self.kind)